@@ -44,7 +44,7 @@ setup_environment() {
   pip install --upgrade pip -q;
   pip install --upgrade uv -q;
 
-  uv sync --frozen -q;
+  uv sync --frozen --all-extras -q;
 }
 
 run_linters() {
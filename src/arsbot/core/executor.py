@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import typing as t
+
+
+# The MediaWiki and phpBB clients use blocking requests/BeautifulSoup calls (and phpBB needs
+# time.sleep() during auth), so they run in worker threads to keep the Discord gateway alive.
+#
+# Background syncs and moderator actions get separate pools so that clicking Approve never
+# waits behind a forum scrape.
+BACKGROUND_MAX_WORKERS = 4
+INTERACTIVE_MAX_WORKERS = 2
+
+background_executor = ThreadPoolExecutor(
+    max_workers=BACKGROUND_MAX_WORKERS,
+    thread_name_prefix="arsbot-background",
+)
+interactive_executor = ThreadPoolExecutor(
+    max_workers=INTERACTIVE_MAX_WORKERS,
+    thread_name_prefix="arsbot-interactive",
+)
+
+
+async def _run_in_executor(executor: ThreadPoolExecutor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def run_in_background(func: t.Callable, /, *args, **kwargs):
+    """
+    Runs a blocking call for a background sync without blocking the event loop.
+    """
+    return await _run_in_executor(background_executor, func, *args, **kwargs)
+
+
+async def run_interactive(func: t.Callable, /, *args, **kwargs):
+    """
+    Runs a blocking call on behalf of a moderator without blocking the event loop.
+    """
+    return await _run_in_executor(interactive_executor, func, *args, **kwargs)
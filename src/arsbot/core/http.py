@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from urllib.parse import urlparse
+import asyncio
+import socket
+import typing as t
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+
+# Shared between every async client so connections are kept alive and pooled.
+CONNECTION_LIMIT = 16
+CONNECTION_LIMIT_PER_HOST = 4
+KEEPALIVE_TIMEOUT_SECONDS = 60
+REQUEST_TIMEOUT_SECONDS = 60
+
+_forced_ips = {}
+_client_session = None
+_client_session_loop = None
+
+
+def force_ip(hostname: str, ip: str) -> None:
+    """
+    Connects to ip whenever hostname is requested, like ForcedIPHTTPSAdapter does for requests.
+
+    TLS and the Host header still use the hostname, so certificates validate as normal.
+    """
+    _forced_ips[hostname] = ip
+
+
+class ForcedIPResolver(AbstractResolver):
+    def __init__(self):
+        self._resolver = DefaultResolver()
+
+    async def resolve(
+        self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET
+    ):
+        if not (forced_ip := _forced_ips.get(host)):
+            return await self._resolver.resolve(host, port, family)
+
+        forced_family = socket.AF_INET6 if ":" in forced_ip else socket.AF_INET
+
+        return [
+            {
+                "hostname": host,
+                "host": forced_ip,
+                "port": port,
+                "family": forced_family,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST,
+            }
+        ]
+
+    async def close(self) -> None:
+        await self._resolver.close()
+
+
+def get_client_session() -> aiohttp.ClientSession:
+    """
+    Returns the shared aiohttp session for the running event loop, creating it if needed.
+    """
+    global _client_session
+    global _client_session_loop
+
+    loop = asyncio.get_running_loop()
+
+    if (
+        _client_session is None
+        or _client_session.closed
+        or _client_session_loop is not loop
+    ):
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS,
+            resolver=ForcedIPResolver(),
+        )
+
+        # Cookies are tracked per AsyncSession instead, so each site keeps its own login.
+        _client_session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECONDS),
+        )
+        _client_session_loop = loop
+
+    return _client_session
+
+
+async def close_client_session() -> None:
+    global _client_session
+    global _client_session_loop
+
+    if _client_session is not None and not _client_session.closed:
+        await _client_session.close()
+
+    _client_session = None
+    _client_session_loop = None
+
+
+@dataclass
+class AsyncResponse:
+    status_code: int
+    url: str
+    text: str
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+
+class AsyncSession:
+    """
+    Async counterpart to a requests.Session with a base URL, built on the shared aiohttp
+    session. Relative URLs are resolved against base_url.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        cookies: t.Optional[t.Mapping[str, str]] = None,
+        headers: t.Optional[t.Mapping[str, str]] = None,
+        forced_ip: t.Optional[str] = None,
+    ):
+        self._base_url = base_url
+        self.cookies = dict(cookies or {})
+        self.headers = dict(headers or {})
+
+        if forced_ip:
+            force_ip(urlparse(base_url).hostname, forced_ip)
+
+    def _make_url(self, url: str) -> str:
+        if url.startswith("https://") or url.startswith("http://"):
+            return url
+
+        parsed_url = urlparse(self._base_url)
+
+        return f"{parsed_url.scheme}://{parsed_url.netloc}{parsed_url.path}{url}"
+
+    def _update_cookies(self, response: aiohttp.ClientResponse) -> None:
+        for hop in (*response.history, response):
+            for key, morsel in hop.cookies.items():
+                if not morsel.value or morsel["max-age"] == "0":
+                    self.cookies.pop(key, None)
+                    continue
+
+                self.cookies[key] = morsel.value
+
+    async def request(self, method: str, url: str, **kwargs) -> AsyncResponse:
+        client_session = get_client_session()
+
+        async with client_session.request(
+            method,
+            self._make_url(url),
+            cookies=self.cookies,
+            headers=self.headers,
+            **kwargs,
+        ) as response:
+            text = await response.text()
+
+            self._update_cookies(response)
+
+            return AsyncResponse(
+                status_code=response.status,
+                url=str(response.url),
+                text=text,
+            )
+
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("POST", url, **kwargs)
@@ -1,4 +1,6 @@
 import asyncio
 
 
-MESSAGE_LOCK = asyncio.Lock()
+# Each integration gets its own lock so a slow forum sync never holds up wiki requests.
+MEDIAWIKI_LOCK = asyncio.Lock()
+PHPBB_LOCK = asyncio.Lock()
@@ -0,0 +1,102 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import typing as t
+
+
+log = logging.getLogger("arsbot")
+
+# A job receives the time it was started at and returns the timestamp it wants to run next.
+JobFunc = t.Callable[[float], t.Awaitable[float]]
+
+
+class Job:
+    def __init__(self, name: str, func: JobFunc, interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+
+    def __repr__(self) -> str:
+        return f"<Job {self.name}>"
+
+
+class Scheduler:
+    """
+    Runs jobs from a heap of next-due timestamps.
+
+    Instead of polling, the loop sleeps until the earliest deadline. Each job reports when
+    it wants to run next, so nothing wakes up unless there is work to do. A job that raises
+    is logged and runs again after its interval, without stopping the other jobs.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._jobs = {}
+        self._wakeup = asyncio.Event()
+
+    def add_job(
+        self,
+        name: str,
+        func: JobFunc,
+        interval: float,
+        run_at: t.Optional[float] = None,
+    ) -> None:
+        if name in self._jobs:
+            raise ValueError(f"Job {name} is already scheduled")
+
+        job = Job(name=name, func=func, interval=interval)
+        self._jobs[name] = job
+
+        self._push(job, time.time() if run_at is None else run_at)
+
+    def next_run_at(self) -> t.Optional[float]:
+        if not self._heap:
+            return None
+
+        return self._heap[0][0]
+
+    def _push(self, job: Job, run_at: float) -> None:
+        heapq.heappush(self._heap, (run_at, next(self._counter), job))
+        self._wakeup.set()
+
+    async def run_pending(self, now: float) -> None:
+        """
+        Runs every job that is due at now and pushes it back with its reported next run.
+        """
+        while self._heap and self._heap[0][0] <= now:
+            _, _, job = heapq.heappop(self._heap)
+
+            started = time.time()
+
+            try:
+                next_run_at = await job.func(started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.exception(f"{job.name} job failed: {exc}")
+                next_run_at = started + job.interval
+
+            self._push(job, next_run_at)
+
+    async def _sleep_until_next_run(self) -> None:
+        self._wakeup.clear()
+
+        if (next_run_at := self.next_run_at()) is None:
+            await self._wakeup.wait()
+            return
+
+        if (delay := next_run_at - time.time()) <= 0:
+            return
+
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run_forever(self) -> None:
+        while True:
+            await self.run_pending(time.time())
+            await self._sleep_until_next_run()
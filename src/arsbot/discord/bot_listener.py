@@ -13,6 +13,9 @@ class BotState:
         self.connected = False
         self.voice_state_update_hooks = []
         self.on_ready_hooks = []
+        self.message_hooks = []
+        self.message_delete_hooks = []
+        self.channel_change_hooks = []
 
 
 bot_state = BotState()
@@ -49,6 +52,27 @@ class BotClient(discord.Client):
         for hook in bot_state.voice_state_update_hooks:
             await hook(self, member, before, after)
 
+    async def on_message(self, message):
+        for hook in bot_state.message_hooks:
+            await hook(self, message)
+
+    async def on_raw_message_delete(self, payload):
+        # Raw events fire even when the deleted message isn't in the message cache
+        for hook in bot_state.message_delete_hooks:
+            await hook(self, payload.channel_id, {payload.message_id})
+
+    async def on_raw_bulk_message_delete(self, payload):
+        for hook in bot_state.message_delete_hooks:
+            await hook(self, payload.channel_id, payload.message_ids)
+
+    async def on_guild_channel_delete(self, channel):
+        for hook in bot_state.channel_change_hooks:
+            await hook(self, channel.id)
+
+    async def on_guild_channel_update(self, before, after):
+        for hook in bot_state.channel_change_hooks:
+            await hook(self, after.id)
+
 
 bot_state.on_ready_hooks.append(sync_command_tree)
 discord.VoiceClient.warn_nacl = False
@@ -1,2 +1,9 @@
 NON_BOT_CLEAR_FREQUENCY_SECONDS = 60
-SYNC_LOOP_DELAY = 1
+
+# How often the pending request indexes are rebuilt from the channel history, in case a
+# gateway event was missed.
+PENDING_REQUEST_RECONCILE_FREQUENCY_SECONDS = 60 * 15
+
+# Moderation log lines that follow each other within this window are sent as one digest.
+# Can be overridden with LOG_DIGEST_WINDOW_SECONDS, 0 sends every line on its own.
+LOG_DIGEST_WINDOW_SECONDS = 30
@@ -0,0 +1,147 @@
+from collections import Counter
+from dataclasses import dataclass
+import asyncio
+import logging
+import os
+import time
+import typing as t
+
+import discord
+
+from .const import LOG_DIGEST_WINDOW_SECONDS
+
+
+log = logging.getLogger("arsbot")
+
+DISCORD_EMBED_DESCRIPTION_LIMIT = 4096
+DISCORD_EMBED_FIELD_LIMIT = 25
+
+
+def get_log_digest_window_seconds() -> float:
+    return float(os.environ.get("LOG_DIGEST_WINDOW_SECONDS", LOG_DIGEST_WINDOW_SECONDS))
+
+
+@dataclass
+class LogEvent:
+    message: str
+    reviewer_name: str
+
+
+class LogDigest:
+    """
+    Batches moderation log lines for one log channel.
+
+    A line logged while the digest is idle is sent straight away. Lines logged within
+    the window after that are held back and sent together as one summary embed when the
+    window ends, which keeps a wave of automod rejections to a handful of messages.
+    """
+
+    def __init__(self, title: str, send: t.Callable[..., t.Awaitable]):
+        self.title = title
+        self.send = send
+
+        self._events = []
+        self._window_ends_at = None
+        self._flush_task = None
+        self._loop = None
+
+    def __repr__(self) -> str:
+        return f"<LogDigest {self.title=} {len(self._events)=}>"
+
+    def _is_flush_pending(self) -> bool:
+        return self._flush_task is not None and not self._flush_task.done()
+
+    async def add(self, message: str, reviewer_name: str) -> None:
+        window_seconds = get_log_digest_window_seconds()
+        now = time.monotonic()
+
+        # Anything left over from an event loop that has since been closed is dropped
+        if self._loop is not (loop := asyncio.get_running_loop()):
+            self._events.clear()
+            self._window_ends_at = None
+            self._flush_task = None
+            self._loop = loop
+
+        if self._is_flush_pending():
+            self._events.append(LogEvent(message, reviewer_name))
+            return
+
+        if (
+            window_seconds <= 0
+            or not self._window_ends_at
+            or now >= self._window_ends_at
+        ):
+            self._window_ends_at = now + window_seconds
+
+            await self.send(message)
+            return
+
+        self._events.append(LogEvent(message, reviewer_name))
+        self._flush_task = asyncio.create_task(
+            self._flush_after(self._window_ends_at - now)
+        )
+
+    async def _flush_after(self, delay: float) -> None:
+        while True:
+            await asyncio.sleep(delay)
+
+            if not self._events:
+                return
+
+            try:
+                await self.flush()
+            except Exception:
+                log.exception(f"Unable to send {self.title} digest")
+
+            # Keep batching while events keep arriving
+            delay = get_log_digest_window_seconds()
+            self._window_ends_at = time.monotonic() + delay
+
+    async def flush(self) -> None:
+        """
+        Sends everything that's been held back as one embed.
+        """
+        events, self._events = self._events, []
+
+        await self.send_summary(events)
+
+    async def send_summary(self, events: t.List[LogEvent]) -> None:
+        """
+        Sends events right away as one message, for callers that batch actions themselves.
+        """
+        if not events:
+            return
+
+        if len(events) == 1:
+            await self.send(events[0].message)
+            return
+
+        await self.send(embed=self.make_embed(events))
+
+    def make_embed(self, events: t.List[LogEvent]) -> discord.Embed:
+        lines = []
+        length = 0
+
+        for index, event in enumerate(events):
+            length += len(event.message) + 1
+
+            # Leave room for the line saying how many were left out
+            if length > DISCORD_EMBED_DESCRIPTION_LIMIT - 32:
+                lines.append(f"...and {len(events) - index} more")
+                break
+
+            lines.append(event.message)
+
+        embed = discord.Embed(
+            title=f"{self.title}: {len(events)} actions",
+            description="\n".join(lines),
+        )
+
+        reviewer_counts = Counter(event.reviewer_name for event in events)
+
+        for reviewer_name, count in reviewer_counts.most_common(
+            DISCORD_EMBED_FIELD_LIMIT
+        ):
+            embed.add_field(name=reviewer_name, value=str(count))
+
+        return embed
@@ -1,18 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
 import logging
 import os
 import re
+import threading
+import time
+import typing as t
 import urllib.parse
 
 import arrow
-from bs4 import BeautifulSoup
+from bs4 import SoupStrainer
 from bs4.element import Tag
 import requests
 from forcediphttpsadapter.adapters import ForcedIPHTTPSAdapter
 import msgpack
 
+from arsbot.core.executor import run_in_background
+from arsbot.core.http import AsyncSession
+from arsbot.utils.files import atomic_write
+from arsbot.utils.html import parse_html
+
 
 log = logging.getLogger("arsbot")
 INVALID_SESSION_TEXT = "There seems to be a problem with your login session"
+LOGIN_PAGE_TITLE = "Special:UserLogin"
+
+MW_SESSION_FILE = "mw_session.data"
+
+ACCOUNT_REQUESTS_URL = "/index.php?title=Special:ConfirmAccounts/authors&wpShowHeld=0"
+ACCOUNT_REQUEST_URL = "/index.php?title=Special:ConfirmAccounts/authors&acrid={acrid}"
+
+# ConfirmAccount doesn't ship an API list of pending requests, so the Action API is only
+# used when WIKI_ACCOUNT_REQUESTS_API_LIST names a list module the wiki provides.
+ACCOUNT_REQUESTS_API_URL = "/api.php"
+ACCOUNT_REQUESTS_API_PREFIX = "acr"
+ACCOUNT_REQUESTS_API_LIMIT = 50
+
+# After the API fails, Special:ConfirmAccounts is scraped for this long before trying again.
+ACCOUNT_REQUESTS_API_RETRY_SECONDS = 60 * 60
+
+# The ConfirmAccounts list only needs the request tables, the list of request links and
+# the next page link.
+ACCOUNT_LIST_STRAINER = SoupStrainer(["table", "ul", "a", "link"])
+
+# How many account requests a batch works on at once, sharing one login.
+ACCOUNT_REQUEST_BATCH_CONCURRENCY = 4
 
 
 class MWSession(requests.Session):
@@ -35,12 +68,34 @@ class MWSession(requests.Session):
         return super().request(method, url, **kwargs)
 
 
+class AsyncMWSession(AsyncSession):
+    """
+    Async MediaWiki session used for reading pages, sharing cookies with a logged in MWSession.
+    """
+
+    @classmethod
+    def from_session(cls, session: MWSession) -> "AsyncMWSession":
+        return cls(
+            base_url=session._base_url,
+            cookies=dict(session.cookies.items()),
+            forced_ip=os.environ.get("WIKI_IP"),
+        )
+
+
 class PhpBBLoginFailed(Exception):
     def __init__(self, response, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.response = response
 
 
+class MWSessionExpired(Exception):
+    pass
+
+
+class AccountRequestsApiError(Exception):
+    pass
+
+
 def _extract_login_form(form: Tag):
     form_fields = {}
 
@@ -55,12 +110,12 @@ def _extract_login_form(form: Tag):
 
 def _load_session(session):
     try:
-        with open("mw_session.data", "rb") as fp:
+        with open(MW_SESSION_FILE, "rb") as fp:
             session_data = msgpack.load(fp)
     except FileNotFoundError:
         return False
     except ValueError:
-        os.remove("mw_session.data")
+        os.remove(MW_SESSION_FILE)
         return False
 
     session.cookies.clear()
@@ -71,37 +126,110 @@ def _load_session(session):
     return True
 
 
-def _validate_session(session):
-    response = session.get("/")
-    home_page = BeautifulSoup(response.text, features="html.parser")
-    if home_page.find(id="pt-logout") is not None:
+def is_session_expired(response) -> bool:
+    """
+    Whether the wiki turned a request away because the session is no longer logged in.
+    """
+    if LOGIN_PAGE_TITLE in urllib.parse.unquote(response.url):
         return True
 
-    return False
+    return INVALID_SESSION_TEXT in response.text
+
 
+def is_logged_in_page(response) -> bool:
+    """
+    Whether response is a page rendered for a logged in user. A logged out session gets a
+    permission error page instead, which never links to Special:UserLogout.
+    """
+    if response.status_code != 200 or is_session_expired(response):
+        return False
 
-def _login_to_mediawiki(force_fresh: bool = False):
-    base_url = os.environ["WIKI_BASE_URL"]
-    session = MWSession(base_url=base_url)
+    return 'id="pt-logout"' in response.text or "Special:UserLogout" in response.text
 
-    if base_ip := os.environ.get("WIKI_IP"):
-        session.mount(base_url, ForcedIPHTTPSAdapter(dest_ip=base_ip))
 
-    if force_fresh:
-        try:
-            os.remove("mw_session.data")
-        except FileNotFoundError:
-            pass
+class MWSessionManager:
+    """
+    Keeps one logged in MWSession for every wiki operation.
+
+    The session isn't checked up front, callers report it with invalidate() when a
+    response shows it was logged out, and the next get_session() logs in again.
+    Cookies are only written to MW_SESSION_FILE when they change.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._saved_cookies = None
+        self._lock = threading.Lock()
+
+    def get_session(self) -> MWSession:
+        with self._lock:
+            if self._session is None:
+                self._session = self._open_session()
+
+            return self._session
+
+    def invalidate(self, session: MWSession) -> None:
+        with self._lock:
+            # Another thread may already have logged in again
+            if self._session is not session:
+                return
+
+            self._session = None
+            self._saved_cookies = None
+
+            try:
+                os.remove(MW_SESSION_FILE)
+            except FileNotFoundError:
+                pass
+
+    def save_cookies(self, session: MWSession) -> None:
+        with self._lock:
+            if self._session is not session:
+                return
+
+            cookies = sorted(session.cookies.items())
+            if cookies == self._saved_cookies:
+                return
+
+            atomic_write(MW_SESSION_FILE, msgpack.dumps(cookies))
+            self._saved_cookies = cookies
 
-    if _load_session(session) and _validate_session(session):
-        return session, True
+    def reset(self) -> None:
+        with self._lock:
+            self._session = None
+            self._saved_cookies = None
 
+    def _open_session(self) -> MWSession:
+        base_url = os.environ["WIKI_BASE_URL"]
+        session = MWSession(base_url=base_url)
+
+        if base_ip := os.environ.get("WIKI_IP"):
+            session.mount(base_url, ForcedIPHTTPSAdapter(dest_ip=base_ip))
+
+        if _load_session(session):
+            self._saved_cookies = sorted(session.cookies.items())
+            return session
+
+        # Raises when the login fails, so a logged out session is never kept
+        _login_to_mediawiki(session)
+
+        cookies = sorted(session.cookies.items())
+        atomic_write(MW_SESSION_FILE, msgpack.dumps(cookies))
+        self._saved_cookies = cookies
+
+        return session
+
+
+mw_session_manager = MWSessionManager()
+
+
+def _login_to_mediawiki(session: MWSession) -> None:
     url = "/index.php?title=Special:UserLogin"
     response = session.get(url)
     if response.status_code != 200:
         raise PhpBBLoginFailed(response)
 
-    login_page = BeautifulSoup(response.text, features="html.parser")
+    login_page = parse_html(response.text)
 
     login_form_fields = None
     for form in login_page.body.find_all("form"):
@@ -128,20 +256,14 @@ def _login_to_mediawiki(force_fresh: bool = False):
     url = "/Special:UserLogin"
     response = session.post(url, params=login_form)
 
-    logged_in_page = BeautifulSoup(response.text, features="html.parser")
-    if logged_in_page.find(id="pt-logout") is not None:
-        # Save cookies
-        cookies = msgpack.dumps(session.cookies.items())
-        with open("mw_session.data", "wb+") as fp:
-            fp.write(cookies)
+    logged_in_page = parse_html(response.text)
 
-    return session, True
+    if logged_in_page.find(id="pt-logout") is None:
+        raise PhpBBLoginFailed(response)
 
 
-def _get_accounts(session, url):
-    response = session.get(url)
-
-    requests_page = BeautifulSoup(response.text, features="html.parser")
+def _parse_accounts_page(text: str):
+    requests_page = parse_html(text, parse_only=ACCOUNT_LIST_STRAINER)
 
     keys = {"Username", "Name", "Email", "Biography"}
 
@@ -186,17 +308,197 @@ def _get_accounts(session, url):
     return account_requests, next_url.attrs["href"]
 
 
-def _load_account_requests(session):
+async def _get_accounts(url: str, retried: bool = False):
+    session = await run_in_background(mw_session_manager.get_session)
+
+    response = await AsyncMWSession.from_session(session).get(url)
+
+    # An empty list from a logged out page would look like every request was handled
+    if not is_logged_in_page(response):
+        if retried:
+            raise MWSessionExpired()
+
+        log.debug("session expired, logging in again...")
+        mw_session_manager.invalidate(session)
+
+        return await _get_accounts(url, retried=True)
+
+    return await run_in_background(_parse_accounts_page, response.text)
+
+
+_account_requests_api_retry_at = None
+
+
+def _use_account_requests_api() -> bool:
+    if not os.environ.get("WIKI_ACCOUNT_REQUESTS_API_LIST"):
+        return False
+
+    return (
+        _account_requests_api_retry_at is None
+        or time.monotonic() >= _account_requests_api_retry_at
+    )
+
+
+def _disable_account_requests_api(exc: AccountRequestsApiError) -> None:
+    global _account_requests_api_retry_at
+
+    log.warning(f"Account requests API failed, scraping HTML instead: {exc}")
+    _account_requests_api_retry_at = (
+        time.monotonic() + ACCOUNT_REQUESTS_API_RETRY_SECONDS
+    )
+
+
+def _parse_api_accounts(data: dict, list_module: str):
+    """
+    Maps one Action API response to the same (accounts, next) shape as
+    _parse_accounts_page, where next holds the continue parameters for the next batch.
+    """
+    if error := data.get("error"):
+        raise AccountRequestsApiError(f"{error.get('code')}: {error.get('info')}")
+
+    try:
+        entries = data["query"][list_module]
+    except (KeyError, TypeError):
+        raise AccountRequestsApiError(f"response has no {list_module} list")
+
     account_requests = {}
 
-    next_link = "/index.php?title=Special:ConfirmAccounts/authors&wpShowHeld=0"
+    for entry in entries:
+        # The fields depend on the wiki's list module, so anything unexpected is an API
+        # failure rather than a crash
+        try:
+            acrid = int(entry["acrid"])
+
+            account_request = {
+                "Username": entry["name"],
+                "Name": entry["real_name"],
+                "Email": entry["email"],
+                "Biography": entry["bio"],
+                "RequestedTimestamp": arrow.get(entry["registration"]),
+                "acrid": acrid,
+            }
+        except (KeyError, TypeError, ValueError) as exc:
+            raise AccountRequestsApiError(f"malformed {list_module} entry: {exc!r}")
+
+        account_requests[ACCOUNT_REQUEST_URL.format(acrid=acrid)] = account_request
+
+    return account_requests, data.get("continue")
+
+
+async def _get_api_accounts(continue_params: dict, retried: bool = False):
+    list_module = os.environ["WIKI_ACCOUNT_REQUESTS_API_LIST"]
+    prefix = os.environ.get(
+        "WIKI_ACCOUNT_REQUESTS_API_PREFIX", ACCOUNT_REQUESTS_API_PREFIX
+    )
+
+    session = await run_in_background(mw_session_manager.get_session)
+
+    params = {
+        "action": "query",
+        "list": list_module,
+        f"{prefix}limit": ACCOUNT_REQUESTS_API_LIMIT,
+        "assert": "user",
+        "format": "json",
+        "formatversion": "2",
+        **continue_params,
+    }
+
+    response = await AsyncMWSession.from_session(session).get(
+        ACCOUNT_REQUESTS_API_URL, params=params
+    )
+
+    try:
+        data = json.loads(response.text)
+    except ValueError:
+        raise AccountRequestsApiError(f"invalid JSON, status {response.status_code}")
+
+    if data.get("error", {}).get("code") == "assertuserfailed":
+        if retried:
+            raise MWSessionExpired()
+
+        log.debug("session expired, logging in again...")
+        mw_session_manager.invalidate(session)
+
+        return await _get_api_accounts(continue_params, retried=True)
+
+    return _parse_api_accounts(data, list_module)
+
+
+class AccountRequestWalk:
+    """
+    Streams the pending account requests (href, account) from Special:ConfirmAccounts
+    a page at a time, loading the next page while the current one is processed. When
+    WIKI_ACCOUNT_REQUESTS_API_LIST is set the pages come from the Action API instead,
+    falling back to the HTML pages if the API's first batch fails. A later batch failing
+    raises AccountRequestsApiError, as the walk can't be completed, and the next walk
+    scrapes the HTML pages.
+
+    With stop_at_acrid, the walk ends after a page that lists its requests newest first
+    and reaches stop_at_acrid, as later pages only hold older requests. stopped_early and
+    lowest_acrid then tell the caller which acrids the walk covered.
+    """
 
-    while next_link:
-        accounts, next_link = _get_accounts(session, next_link)
+    def __init__(self, stop_at_acrid: t.Optional[int] = None):
+        self.stop_at_acrid = stop_at_acrid
+        self.stopped_early = False
+        self.lowest_acrid = None
 
-        account_requests.update(accounts)
+    def _reaches_stop_acrid(self, acrids: t.List[int]) -> bool:
+        if self.stop_at_acrid is None or not acrids:
+            return False
 
-    return account_requests
+        # Only trust the order when the page itself is sorted
+        if acrids != sorted(acrids, reverse=True):
+            return False
+
+        return acrids[-1] <= self.stop_at_acrid
+
+    async def _load_first_page(self):
+        global _account_requests_api_retry_at
+
+        if _use_account_requests_api():
+            try:
+                page = await _get_api_accounts({})
+            except AccountRequestsApiError as exc:
+                _disable_account_requests_api(exc)
+            else:
+                _account_requests_api_retry_at = None
+                return _get_api_accounts, page
+
+        return _get_accounts, await _get_accounts(ACCOUNT_REQUESTS_URL)
+
+    async def __aiter__(self):
+        load_page, page = await self._load_first_page()
+        next_page = None
+
+        try:
+            while page:
+                accounts, next_link = page
+
+                acrids = [account["acrid"] for account in accounts.values()]
+                if acrids and self.lowest_acrid is None:
+                    self.lowest_acrid = min(acrids)
+                elif acrids:
+                    self.lowest_acrid = min(self.lowest_acrid, *acrids)
+
+                if next_link and self._reaches_stop_acrid(acrids):
+                    self.stopped_early = True
+                elif next_link:
+                    next_page = asyncio.ensure_future(load_page(next_link))
+
+                for href, account in accounts.items():
+                    yield href, account
+
+                try:
+                    page = await next_page if next_page else None
+                except AccountRequestsApiError as exc:
+                    _disable_account_requests_api(exc)
+                    raise
+
+                next_page = None
+        finally:
+            if next_page:
+                next_page.cancel()
 
 
 def create_account_from_request(
@@ -227,7 +529,7 @@ def create_account_from_request(
 
     create_response = session.post(create_url, params=form)
 
-    create_response_page = BeautifulSoup(create_response.text, features="html.parser")
+    create_response_page = parse_html(create_response.text)
     page_error = create_response_page.find("div", class_="errorbox")
     error_box = create_response_page.find("div", class_="mw-message-box-error")
 
@@ -252,14 +554,24 @@ def process_account_request(
 ):
     log.debug(f"processing account! {request.acrid}, {approved=}, {reviewer_name=}")
 
-    session, logged_in = _login_to_mediawiki(force_fresh=retried)
+    session = mw_session_manager.get_session()
 
     request_url = (
         f"/index.php?title=Special:ConfirmAccounts/authors&acrid={request.acrid}"
     )
     response = session.get(request_url)
 
-    request_page = BeautifulSoup(response.text, features="html.parser")
+    if not is_logged_in_page(response) and not retried:
+        log.debug("session expired, retrying...")
+        mw_session_manager.invalidate(session)
+        return process_account_request(
+            request=request,
+            approved=approved,
+            reviewer_name=reviewer_name,
+            retried=True,
+        )
+
+    request_page = parse_html(response.text)
 
     edit_token = ""
     for form_input in request_page.find_all("input"):
@@ -283,7 +595,9 @@ def process_account_request(
     update_url = "/Special:ConfirmAccounts/authors"
     response = session.post(update_url, params=moderate_user_form)
 
-    response_page = BeautifulSoup(response.text, features="html.parser")
+    mw_session_manager.save_cookies(session)
+
+    response_page = parse_html(response.text)
     page_error = response_page.find("div", class_="errorbox")
 
     approve_part_1_success = False
@@ -308,6 +622,7 @@ def process_account_request(
             retried=retried,
         )
         if created is None and not retried:
+            mw_session_manager.invalidate(session)
             return process_account_request(
                 request=request,
                 approved=approved,
@@ -322,6 +637,7 @@ def process_account_request(
         log.error(page_error.text)
         if INVALID_SESSION_TEXT in page_error.text and not retried:
             log.debug("retrying...")
+            mw_session_manager.invalidate(session)
             return process_account_request(
                 request=request,
                 approved=approved,
@@ -335,8 +651,43 @@ def process_account_request(
         return False
 
 
-def get_pending_accounts():
-    session, logged_in = _login_to_mediawiki()
+def process_account_requests(
+    account_requests,  # t.List[MediaWikiAccountRequest]
+    approved: bool,
+    reviewer_name: str,
+) -> dict:
+    """
+    Approves or rejects every request in account_requests with one login, working on up to
+    ACCOUNT_REQUEST_BATCH_CONCURRENCY at a time. Returns acrid -> whether it succeeded.
+    """
+    if not account_requests:
+        return {}
+
+    # Log in before starting the workers so they all share the session
+    mw_session_manager.get_session()
+
+    def _process(request):
+        try:
+            return process_account_request(
+                request=request,
+                approved=approved,
+                reviewer_name=reviewer_name,
+            )
+        except Exception:
+            log.exception(f"Unable to process account request {request.acrid}")
+            return False
+
+    with ThreadPoolExecutor(
+        max_workers=ACCOUNT_REQUEST_BATCH_CONCURRENCY,
+        thread_name_prefix="arsbot-account-requests",
+    ) as executor:
+        results = executor.map(_process, account_requests)
+
+        return {
+            request.acrid: bool(result)
+            for request, result in zip(account_requests, results)
+        }
+
 
-    account_requests = _load_account_requests(session)
-    return account_requests
+async def get_pending_accounts():
+    return {href: account async for href, account in AccountRequestWalk()}
@@ -2,11 +2,17 @@ import logging
 import os
 
 import discord
-from discord.errors import NotFound
 
 from arsbot.core.db import bot_session
 from arsbot.models import MediaWikiAccountRequest
 
+from ..outbound import outbound_dispatcher, Priority
+from ..pending_requests import get_pending_request_index
+from ..utils import (
+    delete_messages,
+    iter_history_pages,
+)
+
 
 log = logging.getLogger("arsbot")
 
@@ -50,33 +56,39 @@ def _make_embed(acrid, account):
     return embed
 
 
-async def get_requests_from_channel(client, channel, view):
+async def get_requests_from_channel(channel):
     """
-    Syncs bot-generated wiki account messages from our database with a Discord view
-    so the buttons can be re-connected to the handle_approve and handle_deny callbacks.
+    Matches the wiki account messages in the channel with our database, deleting any
+    message that isn't attached to a request.
+
+    Returns the acrid -> message id of every request found in the channel, views are
+    registered for them through PendingRequestIndex.register_views().
     """
-    known_request_ids = set()
+    known_request_ids = {}
 
     with bot_session() as session:
-        async for message in channel.history():
-            account_request = (
-                session.query(
+        async for messages in iter_history_pages(channel):
+            account_requests = {
+                account_request.discord_message_id: account_request
+                for account_request in session.query(
                     MediaWikiAccountRequest.acrid,
                     MediaWikiAccountRequest.discord_message_id,
+                ).filter(
+                    MediaWikiAccountRequest.discord_message_id.in_(
+                        [message.id for message in messages]
+                    )
                 )
-                .filter_by(discord_message_id=message.id)
-                .one_or_none()
-            )
+            }
 
-            if not account_request:
-                log.debug(
-                    f"Found message {message.id} not attached to a db entry, deleting"
-                )
-                await message.delete()
-                continue
+            for message in messages:
+                if not (account_request := account_requests.get(message.id)):
+                    log.debug(
+                        f"Found message {message.id} not attached to a db entry, deleting"
+                    )
+                    await message.delete()
+                    continue
 
-            known_request_ids.add(account_request.acrid)
-            client.add_view(view, message_id=account_request.discord_message_id)
+                known_request_ids[account_request.acrid] = message.id
 
     return known_request_ids
 
@@ -91,38 +103,53 @@ async def send_discord_account_request_message(
     embed = _make_embed(acrid, account)
     log.debug(f"Creating and sending new record {acrid}")
 
-    message = await channel.send(embed=embed, view=view)
+    message = await outbound_dispatcher.send(
+        channel, embed=embed, view=view, priority=Priority.MODERATION
+    )
+
+    get_pending_request_index(channel.id).add(acrid, message.id)
 
     return message
 
 
-async def purge_handled_requests(known_acrids, channel):
+async def purge_handled_requests(known_acrids, channel, min_acrid=None):
     """
     Delete records where the request was handled through the web ui.
+
+    When only part of the request list was read, min_acrid limits the purge to the acrids
+    that part covered.
     """
     with bot_session() as session:
-        handled_requests = (
+        query = (
             session.query(MediaWikiAccountRequest)
             .filter(~MediaWikiAccountRequest.acrid.in_(list(known_acrids)))
             .filter(MediaWikiAccountRequest.time_resolved.is_(None))
-            .all()
         )
 
-        if handled_requests:
-            log.debug(f"{len(handled_requests)} handled requests pending prune")
+        if min_acrid is not None:
+            query = query.filter(MediaWikiAccountRequest.acrid >= min_acrid)
+
+        handled_requests = query.all()
+
+        if not handled_requests:
+            return
+
+        log.debug(f"{len(handled_requests)} handled requests pending prune")
+
+        await delete_messages(
+            channel,
+            [
+                handled_request.discord_message_id
+                for handled_request in handled_requests
+            ],
+        )
+
+        pending_requests = get_pending_request_index(channel.id)
 
         for handled_request in handled_requests:
             log.debug(f"Removing handled request {handled_request}")
 
-            try:
-                message = await channel.fetch_message(
-                    handled_request.discord_message_id
-                )
-                await message.delete()
-            except NotFound:
-                log.error(
-                    f"Tried to delete a message but its gone ({handled_request.discord_message_id}) {handled_request}"
-                )
-
+            pending_requests.discard_request(handled_request.acrid)
             session.delete(handled_request)
-            session.commit()
+
+        session.commit()
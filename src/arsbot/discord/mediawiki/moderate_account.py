@@ -2,12 +2,14 @@ import arrow
 import discord
 
 from arsbot.core.db import bot_session
+from arsbot.core.executor import run_interactive
 from arsbot.models import MediaWikiAccountRequest
 
 from .api_client import process_account_request
+from ..pending_requests import get_pending_request_index
 from ..utils import (
     send_to_debug,
-    send_to_wiki_log,
+    wiki_log_digest,
 )
 
 
@@ -45,7 +47,8 @@ async def handle_mediawiki_account(
 
         # print(f'Found account_request! {request}')
 
-        account_processed = process_account_request(
+        account_processed = await run_interactive(
+            process_account_request,
             request=request,
             approved=approved,
             reviewer_name=reviewer_name,
@@ -71,6 +74,9 @@ async def handle_mediawiki_account(
         action = "approved" if approved else "denied"
         message = f"Wiki account for {request.username} {action} by {reviewer_name}"
 
-        await send_to_wiki_log(message)
+        await wiki_log_digest.add(message, reviewer_name)
 
         await interaction.message.delete()
+        get_pending_request_index(interaction.channel_id).discard_message(
+            interaction.message.id
+        )
@@ -1,8 +1,7 @@
 from datetime import datetime, timedelta, timezone
-import asyncio
 import logging
 import os
-import time
+import typing as t
 
 import arrow
 import discord
@@ -10,13 +9,17 @@ from aiohttp.client_exceptions import ClientOSError
 from discord.errors import DiscordServerError
 
 from arsbot.core.db import bot_session
-from arsbot.core.lock import MESSAGE_LOCK
+from arsbot.core.executor import run_in_background
+from arsbot.core.lock import MEDIAWIKI_LOCK
+from arsbot.core.scheduler import Scheduler
 from arsbot.models import MediaWikiAccountRequest
 
 from .api_client import (
-    get_pending_accounts,
+    AccountRequestWalk,
+    AccountRequestsApiError,
+    MWSessionExpired,
     PhpBBLoginFailed,
-    process_account_request,
+    process_account_requests,
 )
 from .automod import get_spam_categories_for_request
 from .channels import (
@@ -27,21 +30,27 @@ from .channels import (
 from .moderate_account import handle_mediawiki_account
 from .view import ApprovalView
 from ..bot_listener import BotClient
-from ..const import (
-    NON_BOT_CLEAR_FREQUENCY_SECONDS,
-    SYNC_LOOP_DELAY,
-)
+from ..const import NON_BOT_CLEAR_FREQUENCY_SECONDS
+from ..log_digest import LogEvent
+from ..outbound import outbound_dispatcher, Priority
+from ..pending_requests import get_pending_request_index
 from ..utils import (
     delete_non_bot_messages,
+    resolve_channel,
     send_to_debug,
-    send_to_wiki_log,
     task_state,
+    wiki_log_digest,
 )
 
 
 log = logging.getLogger("arsbot")
 
 MEDIA_WIKI_SYNC_FREQUENCY_SECONDS = 10
+MEDIA_WIKI_AUTOMOD_FREQUENCY_SECONDS = 60 * 60
+
+# Syncs stop reading the request list once they reach requests we already know about. A
+# full read every so often finds requests handled on the wiki further down the list.
+MEDIA_WIKI_FULL_SYNC_FREQUENCY_SECONDS = 60 * 15
 
 
 async def init_mediawiki_task(client: BotClient):
@@ -57,6 +66,13 @@ async def init_mediawiki_task(client: BotClient):
         timeout=None, handle_mediawiki_account=handle_mediawiki_account
     )
 
+    # Read the channel history on the first sync after (re)starting
+    task_state.pending_requests = get_pending_request_index(
+        task_state.requests_channel.id
+    )
+    task_state.pending_requests.mark_stale()
+    task_state.next_full_account_walk = None
+
 
 async def _process_new_account_request(acrid: int, href: str, account):
     account_request = MediaWikiAccountRequest(
@@ -108,8 +124,10 @@ async def _process_new_account_request(acrid: int, href: str, account):
         )
 
         channel_id = os.environ["DISCORD_WIKI_LOGS_CHANNEL_ID"]
-        channel = await task_state.client.fetch_channel(channel_id)
-        discord_message = await channel.send(embed=embed)
+        channel = await resolve_channel(task_state.client, channel_id)
+        discord_message = await outbound_dispatcher.send(
+            channel, embed=embed, priority=Priority.LOG
+        )
     else:
         discord_message = await send_discord_account_request_message(
             acrid=acrid,
@@ -134,17 +152,9 @@ async def handle_automod_requests():
     # Once rejected, send a message to #wiki-logs
     # saying account has been rejected by automod.
     now = datetime.now(timezone.utc)
-    now_ts = int(time.time())
     in_48h = now + timedelta(days=2)
 
     with bot_session() as session:
-        last_ts = task_state.last_wiki_automod_execute_report
-
-        if last_ts is not None and ((now_ts - last_ts) / 60) < 60:
-            return
-
-        task_state.last_wiki_automod_execute_report = now_ts
-
         account_requests = (
             session.query(MediaWikiAccountRequest)
             .filter(MediaWikiAccountRequest.automod_spam_categories.isnot(None))
@@ -159,25 +169,43 @@ async def handle_automod_requests():
         reviewer_name = task_state.client.user.display_name
         reviewer_id = task_state.client.user.id
 
+        if not account_requests:
+            return
+
+        results = await run_in_background(
+            process_account_requests,
+            account_requests=account_requests,
+            approved=0,
+            reviewer_name=reviewer_name,
+        )
+
+        time_resolved = arrow.utcnow().datetime
+        failed = 0
+        events = []
+
         for request in account_requests:
-            if not process_account_request(
-                request=request,
-                approved=0,
-                reviewer_name=reviewer_name,
-            ):
-                await send_to_debug("Failed to process mediawiki account confirmation")
+            if not results.get(request.acrid):
+                failed += 1
                 continue
 
-            request.time_resolved = arrow.utcnow().datetime
+            request.time_resolved = time_resolved
             request.action = 0
             request.handled_by_id = reviewer_id
             request.handled_by_name = reviewer_name
             session.add(request)
-            session.commit()
 
             message = f"Wiki account for {request.username} denied by {reviewer_name}"
+            events.append(LogEvent(message, reviewer_name))
 
-            await send_to_wiki_log(message)
+        session.commit()
+
+    if failed:
+        await send_to_debug(
+            f"Failed to process {failed} of {len(account_requests)} mediawiki account "
+            "confirmations"
+        )
+
+    await wiki_log_digest.send_summary(events)
 
 
 def _get_automod_requests():
@@ -196,50 +224,56 @@ def _get_automod_requests():
     return known_request_ids
 
 
-async def run_mediawiki_task_once(now: float):
-    if task_state.try_check_non_bot_messages(now, NON_BOT_CLEAR_FREQUENCY_SECONDS):
-        try:
-            # log.debug('syncing non bot messages')
-            await delete_non_bot_messages(
-                task_state.client, task_state.requests_channel
-            )
-        except (DiscordServerError, ClientOSError) as exc:
-            log.exception(f"Failed to call delete_non_bot_messages: {exc}")
-            return
+async def run_mediawiki_non_bot_purge(now: float) -> float:
+    try:
+        await delete_non_bot_messages(task_state.client, task_state.requests_channel)
+    except (DiscordServerError, ClientOSError) as exc:
+        log.exception(f"Failed to call delete_non_bot_messages: {exc}")
 
-    if (
-        task_state.last_mediawiki_sync
-        and now - task_state.last_mediawiki_sync < MEDIA_WIKI_SYNC_FREQUENCY_SECONDS
-    ):
-        # TODO: Maybe return the amount of seconds we should wait in the main loop?
-        await asyncio.sleep(SYNC_LOOP_DELAY)
-        return
+    return now + NON_BOT_CLEAR_FREQUENCY_SECONDS
 
-    # log.debug('syncing mediawiki')
 
-    task_state.last_mediawiki_sync = now
+async def _get_known_request_ids(now: float) -> t.Optional[t.Set[int]]:
+    """
+    Returns the acrids that have a message in the requests channel. The channel history is
+    only read when the pending request index needs to be reconciled.
+    """
+    pending_requests = task_state.pending_requests
 
-    async with MESSAGE_LOCK:
+    if pending_requests.needs_reconcile(now):
         try:
-            known_request_ids = await get_requests_from_channel(
-                task_state.client,
-                task_state.requests_channel,
-                view=task_state.approval_view,
+            request_messages = await get_requests_from_channel(
+                task_state.requests_channel
             )
         except (DiscordServerError, ClientOSError) as exc:
             log.exception(f"Failed to get channel requests: {exc}")
-            return
+            return None
 
-        known_request_ids |= _get_automod_requests()
+        pending_requests.reconcile(request_messages, now)
+        pending_requests.register_views(task_state.client, task_state.approval_view)
+
+    return pending_requests.request_ids()
 
-        try:
-            pending_mediawiki_accounts = get_pending_accounts()
-        except PhpBBLoginFailed as exc:
-            log.exception(f"Failed to login to MediaWiki: {exc}")
-            return
 
-        known_acrids = set()
-        for href, account in pending_mediawiki_accounts.items():
+async def _sync_mediawiki_requests(now: float):
+    if (known_request_ids := await _get_known_request_ids(now)) is None:
+        return
+
+    known_request_ids |= _get_automod_requests()
+
+    full_walk = (
+        task_state.next_full_account_walk is None
+        or now >= task_state.next_full_account_walk
+    )
+
+    account_requests = AccountRequestWalk(
+        stop_at_acrid=None if full_walk else max(known_request_ids, default=None)
+    )
+
+    known_acrids = set()
+
+    try:
+        async for href, account in account_requests:
             acrid = account["acrid"]
             known_acrids.add(acrid)
 
@@ -252,6 +286,63 @@ async def run_mediawiki_task_once(now: float):
                 href=href,
                 account=account,
             )
+    # Without the full list, purging would delete requests that are still pending
+    except (PhpBBLoginFailed, MWSessionExpired) as exc:
+        log.exception(f"Failed to login to MediaWiki: {exc!r}")
+        return
+    except AccountRequestsApiError as exc:
+        log.warning(f"Account requests API failed during the sync: {exc}")
+        return
+
+    if account_requests.stopped_early:
+        await purge_handled_requests(
+            known_acrids,
+            task_state.requests_channel,
+            min_acrid=account_requests.lowest_acrid,
+        )
+        return
+
+    await purge_handled_requests(known_acrids, task_state.requests_channel)
+
+    task_state.next_full_account_walk = now + MEDIA_WIKI_FULL_SYNC_FREQUENCY_SECONDS
 
-        await purge_handled_requests(known_acrids, task_state.requests_channel)
+
+async def run_mediawiki_sync(now: float) -> float:
+    async with MEDIAWIKI_LOCK:
+        await _sync_mediawiki_requests(now)
+
+    return now + MEDIA_WIKI_SYNC_FREQUENCY_SECONDS
+
+
+async def run_mediawiki_automod(now: float) -> float:
+    async with MEDIAWIKI_LOCK:
         await handle_automod_requests()
+
+    return now + MEDIA_WIKI_AUTOMOD_FREQUENCY_SECONDS
+
+
+async def run_mediawiki_integration(client: BotClient):
+    """
+    Runs the MediaWiki jobs on their own scheduler so they never wait on the forum sync.
+    """
+    await init_mediawiki_task(client)
+
+    scheduler = Scheduler()
+
+    scheduler.add_job(
+        "mediawiki_non_bot_purge",
+        run_mediawiki_non_bot_purge,
+        interval=NON_BOT_CLEAR_FREQUENCY_SECONDS,
+    )
+    scheduler.add_job(
+        "mediawiki_sync",
+        run_mediawiki_sync,
+        interval=MEDIA_WIKI_SYNC_FREQUENCY_SECONDS,
+    )
+    scheduler.add_job(
+        "mediawiki_automod",
+        run_mediawiki_automod,
+        interval=MEDIA_WIKI_AUTOMOD_FREQUENCY_SECONDS,
+    )
+
+    await scheduler.run_forever()
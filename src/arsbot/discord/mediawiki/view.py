@@ -3,7 +3,7 @@ import os
 
 import discord
 
-from arsbot.core.lock import MESSAGE_LOCK
+from arsbot.core.lock import MEDIAWIKI_LOCK
 
 
 log = logging.getLogger("arsbot")
@@ -44,7 +44,7 @@ class ApprovalView(discord.ui.View):
             )
             return
 
-        async with MESSAGE_LOCK:
+        async with MEDIAWIKI_LOCK:
             await self.handle_mediawiki_account(
                 discord_message_id=interaction.message.id,
                 approved=True,
@@ -75,7 +75,7 @@ class ApprovalView(discord.ui.View):
             )
             return
 
-        async with MESSAGE_LOCK:
+        async with MEDIAWIKI_LOCK:
             await self.handle_mediawiki_account(
                 discord_message_id=interaction.message.id,
                 approved=False,
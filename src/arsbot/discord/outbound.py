@@ -0,0 +1,203 @@
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+import enum
+import logging
+import typing as t
+
+
+log = logging.getLogger("arsbot")
+
+
+class Priority(enum.IntEnum):
+    # Lower values are sent first
+    MODERATION = 0
+    LOG = 1
+    DEBUG = 2
+
+
+# How many messages may wait per priority before senders have to wait for room.
+MAX_QUEUED_MESSAGES = {
+    Priority.MODERATION: 50,
+    Priority.LOG: 100,
+    Priority.DEBUG: 100,
+}
+
+# Messages are sent this many at a time, never more than one per channel.
+DISPATCH_CONCURRENCY = 2
+
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+@dataclass(eq=False)
+class OutboundMessage:
+    channel: t.Any
+    content: t.Optional[str]
+    kwargs: dict
+    future: asyncio.Future = field(repr=False)
+
+    @property
+    def can_coalesce(self) -> bool:
+        """
+        Only plain text can be merged with other messages to the same channel.
+        """
+        return bool(self.content) and not self.kwargs
+
+
+class OutboundDispatcher:
+    """
+    Sends every Discord message from one place, so a burst of logs can't use up the rate
+    limit that moderation messages need.
+
+    Messages are sent by priority. Plain text lines queued for the same channel are merged
+    into one message, and senders wait once a priority's queue is full. Until start() is
+    called, messages are sent right away.
+    """
+
+    def __init__(self):
+        self._queues = {priority: deque() for priority in Priority}
+        self._busy_channels = set()
+        self._changed = None
+        self._workers = []
+
+    def is_running(self) -> bool:
+        return any(not worker.done() for worker in self._workers)
+
+    def start(self) -> None:
+        if self.is_running():
+            return
+
+        self._changed = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._run_worker()) for _ in range(DISPATCH_CONCURRENCY)
+        ]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._busy_channels.clear()
+
+        for queue in self._queues.values():
+            while queue:
+                queue.popleft().future.cancel()
+
+    async def send(
+        self,
+        channel,
+        content: t.Optional[str] = None,
+        *,
+        priority: Priority = Priority.LOG,
+        **kwargs,
+    ):
+        """
+        Queues a message for channel and waits until it's sent, returning the message.
+        """
+        if not self.is_running():
+            return await channel.send(content, **kwargs)
+
+        queue = self._queues[priority]
+
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: len(queue) < MAX_QUEUED_MESSAGES[priority]
+            )
+
+            future = asyncio.get_running_loop().create_future()
+            queue.append(OutboundMessage(channel, content, kwargs, future))
+
+            self._changed.notify_all()
+
+        return await future
+
+    def _take_next(self) -> t.Optional[t.List[OutboundMessage]]:
+        for priority in Priority:
+            queue = self._queues[priority]
+
+            for index, outbound in enumerate(queue):
+                if outbound.channel.id in self._busy_channels:
+                    continue
+
+                del queue[index]
+
+                batch = [outbound]
+                if outbound.can_coalesce:
+                    batch += self._take_coalescable(queue, outbound, index)
+
+                return batch
+
+        return None
+
+    def _take_coalescable(
+        self, queue: deque, first: OutboundMessage, start: int
+    ) -> t.List[OutboundMessage]:
+        taken = []
+        length = len(first.content)
+
+        for outbound in list(queue)[start:]:
+            if outbound.channel.id != first.channel.id:
+                continue
+
+            # Keep the channel's messages in order
+            if not outbound.can_coalesce:
+                break
+
+            length += len(outbound.content) + 1
+            if length > DISCORD_MESSAGE_LIMIT:
+                break
+
+            taken.append(outbound)
+
+        for outbound in taken:
+            queue.remove(outbound)
+
+        return taken
+
+    async def _deliver(self, batch: t.List[OutboundMessage]) -> None:
+        first = batch[0]
+
+        if len(batch) > 1:
+            content = "\n".join(outbound.content for outbound in batch)
+        else:
+            content = first.content
+
+        try:
+            message = await first.channel.send(content, **first.kwargs)
+        except asyncio.CancelledError:
+            # Stopped mid-send, the senders would otherwise wait forever
+            for outbound in batch:
+                outbound.future.cancel()
+            raise
+        except Exception as exc:
+            for outbound in batch:
+                if not outbound.future.done():
+                    outbound.future.set_exception(exc)
+            return
+
+        for outbound in batch:
+            if not outbound.future.done():
+                outbound.future.set_result(message)
+
+    async def _run_worker(self) -> None:
+        while True:
+            async with self._changed:
+                while (batch := self._take_next()) is None:
+                    await self._changed.wait()
+
+                channel_id = batch[0].channel.id
+                self._busy_channels.add(channel_id)
+
+                # Senders waiting for room in the queue can continue
+                self._changed.notify_all()
+
+            try:
+                await self._deliver(batch)
+            finally:
+                async with self._changed:
+                    self._busy_channels.discard(channel_id)
+                    self._changed.notify_all()
+
+
+outbound_dispatcher = OutboundDispatcher()
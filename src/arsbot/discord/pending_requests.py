@@ -0,0 +1,144 @@
+import logging
+import typing as t
+
+from .bot_listener import bot_state
+from .const import PENDING_REQUEST_RECONCILE_FREQUENCY_SECONDS
+
+
+log = logging.getLogger("arsbot")
+
+
+class PendingRequestIndex:
+    """
+    Tracks which requests have a message in a moderation channel (request id -> message id).
+
+    It's rebuilt from the channel history on startup, after a reconnect and every
+    PENDING_REQUEST_RECONCILE_FREQUENCY_SECONDS. In between it's kept current from our
+    own sends and deletes plus message events from the gateway.
+
+    It also remembers which messages already have their view registered with discord.py,
+    so views are only registered once per message instead of on every reconciliation.
+    """
+
+    def __init__(self, channel_id: int):
+        self.channel_id = channel_id
+
+        self._message_ids = {}
+        self._request_ids = {}
+
+        # Bot messages seen on the gateway that didn't belong to a tracked request yet
+        self._unmatched_message_ids = set()
+        self._reconciled_at = None
+
+        self._registered_message_ids = set()
+
+    def __repr__(self) -> str:
+        return f"<PendingRequestIndex {self.channel_id=} {len(self._message_ids)=}>"
+
+    def needs_reconcile(self, now: float) -> bool:
+        self._unmatched_message_ids -= self._request_ids.keys()
+
+        if self._reconciled_at is None or self._unmatched_message_ids:
+            return True
+
+        return now - self._reconciled_at >= PENDING_REQUEST_RECONCILE_FREQUENCY_SECONDS
+
+    def reconcile(self, message_ids: t.Mapping[int, int], now: float) -> None:
+        """
+        Replaces the index with message_ids, as read from the channel history.
+        """
+        self._message_ids = dict(message_ids)
+        self._request_ids = {
+            message_id: request_id for request_id, message_id in message_ids.items()
+        }
+        self._unmatched_message_ids.clear()
+        self._reconciled_at = now
+
+        self._registered_message_ids &= self._request_ids.keys()
+
+    def mark_stale(self) -> None:
+        """
+        Forces a reconciliation and view registration pass on the next sync.
+        """
+        self._reconciled_at = None
+        self._registered_message_ids.clear()
+
+    def register_views(self, client, view) -> int:
+        """
+        Registers view for every tracked message that doesn't have it registered yet.
+        """
+        registered = 0
+
+        for message_id in self._request_ids.keys() - self._registered_message_ids:
+            client.add_view(view, message_id=message_id)
+            self._registered_message_ids.add(message_id)
+            registered += 1
+
+        return registered
+
+    def request_ids(self) -> t.Set[int]:
+        return set(self._message_ids)
+
+    def add(self, request_id: int, message_id: int) -> None:
+        """
+        Tracks a message we just sent. discord.py registers the view it was sent with.
+        """
+        self._message_ids[request_id] = message_id
+        self._request_ids[message_id] = request_id
+        self._registered_message_ids.add(message_id)
+
+    def discard_request(self, request_id: int) -> None:
+        if (message_id := self._message_ids.pop(request_id, None)) is not None:
+            self._request_ids.pop(message_id, None)
+            self._registered_message_ids.discard(message_id)
+
+    def discard_message(self, message_id: int) -> None:
+        if (request_id := self._request_ids.pop(message_id, None)) is not None:
+            self._message_ids.pop(request_id, None)
+            self._registered_message_ids.discard(message_id)
+
+    def note_message(self, message_id: int) -> None:
+        if message_id not in self._request_ids:
+            self._unmatched_message_ids.add(message_id)
+
+
+# channel id -> PendingRequestIndex
+_pending_request_indexes = {}
+
+
+def get_pending_request_index(channel_id: int) -> PendingRequestIndex:
+    channel_id = int(channel_id)
+
+    if not (index := _pending_request_indexes.get(channel_id)):
+        index = PendingRequestIndex(channel_id)
+        _pending_request_indexes[channel_id] = index
+
+    return index
+
+
+async def _on_message(client, message):
+    if not (index := _pending_request_indexes.get(message.channel.id)):
+        return
+
+    # Someone else's messages are cleaned up by delete_non_bot_messages
+    if message.author.id == client.user.id:
+        index.note_message(message.id)
+
+
+async def _on_message_delete(client, channel_id: int, message_ids: t.Set[int]):
+    if not (index := _pending_request_indexes.get(channel_id)):
+        return
+
+    for message_id in message_ids:
+        index.discard_message(message_id)
+
+
+async def _on_ready(client):
+    # Events may have been missed while disconnected, re-read and re-register everything
+    for index in _pending_request_indexes.values():
+        index.mark_stale()
+
+
+bot_state.message_hooks.append(_on_message)
+bot_state.message_delete_hooks.append(_on_message_delete)
+bot_state.on_ready_hooks.append(_on_ready)
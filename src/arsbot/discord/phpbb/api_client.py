@@ -1,23 +1,30 @@
+import asyncio
 import enum
-import functools
 from dataclasses import dataclass
 import logging
 import os
 import re
 import sys
+import threading
 import time
 import typing as t
 from urllib.parse import parse_qs, urlparse
 
 import arrow
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from bs4.element import Tag
 import msgpack
 import requests
 from forcediphttpsadapter.adapters import ForcedIPHTTPSAdapter
 
+from arsbot.core.db import bot_session
+from arsbot.core.executor import run_in_background
+from arsbot.core.http import AsyncSession
+from arsbot.models import PhpbbUserProfile
+from arsbot.utils.files import atomic_write
+from arsbot.utils.html import parse_html
 from arsbot.version import VERSION
-from arsbot.utils.ipinfo import get_ip_address_info
+from arsbot.utils.ipinfo import get_ip_addresses_info
 
 
 log = logging.getLogger("arsbot")
@@ -33,14 +40,67 @@ class PhpBBADMError(Exception):
 
 PHPBB_SESSION_FILE = "phpbb_session.data"
 
+# From phpBB/includes/functions.php:2070
+#
+# // If creation_time and the time() now is zero we can assume
+#    it was not a human doing this (the check for if ($diff)...
+#
+# Forms are only posted once they've been loaded for this long, otherwise the
+# creation_time checker will kick us out.
+PHPBB_FORM_MIN_AGE_SECONDS = 3
+
+# How long a re-authenticated ACP session is reused without logging in again. If phpBB
+# expires it sooner the ACP rejects the sid and we re-authenticate then.
+PHPBB_ADM_SESSION_TTL_SECONDS = 60 * 30
+
+# How many queued posts are enriched at the same time.
+PHPBB_ENRICH_CONCURRENCY = 4
+
+PHPBB_POSTS_PER_PAGE = 10
+PHPBB_TOPIC_CACHE_SIZE = 512
+
+# Pages that are only read for one part are parsed partially
+MCP_STRAINER = SoupStrainer(id="mcp")
+FORM_STRAINER = SoupStrainer("form")
+
+PAGE_PAT = re.compile(r"Page (\d+) of (\d+)")
+POST_COUNT_PAT = re.compile(r"\[ (\d+) posts? \]")
+
+# topic_id -> (post count, last approved post date), dropped once the post count changes
+# or a queued post in the topic is moderated
+_last_approved_post_dates = {}
+
+# post_id -> topic_id for queued posts, so moderating one can drop its topic's entry
+_queued_post_topics = {}
+
+# How long an author's cached profile is used before their profile page is loaded again.
+PHPBB_USER_PROFILE_TTL_SECONDS = 60 * 60
+
+# author_id -> in-flight profile load, so an author with several queued posts is loaded once
+_user_profile_loads = {}
+
 _vi = sys.version_info
 _PY_VERSION = f"{_vi.major}.{_vi.minor}.{_vi.micro}"
 DEFAULT_HEADERS = {"User-Agent": f"arsbot v{VERSION}; Python {_PY_VERSION}"}
 
 
-def on_request_end(session, response, *args, **kwargs):
-    # log.debug('on_request_end, saving session...')
-    session.save_session()
+class PhpBBCookieJar(requests.cookies.RequestsCookieJar):
+    """
+    Cookie jar that counts its changes, so PhpBBSession only looks through the cookies
+    again after they changed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def set_cookie(self, cookie, *args, **kwargs):
+        super().set_cookie(cookie, *args, **kwargs)
+        self.version += 1
+
+    def clear(self, *args, **kwargs):
+        super().clear(*args, **kwargs)
+        self.version += 1
 
 
 class PhpBBSession(requests.Session):
@@ -49,31 +109,67 @@ class PhpBBSession(requests.Session):
 
         super().__init__(*args, **kwargs)
 
-        on_request_end_with_session = functools.partial(on_request_end, self)
+        self.cookies = PhpBBCookieJar()
 
-        self.hooks["response"].append(on_request_end_with_session)
+        self._cookies_version = None
+        self._saved_cookies_version = None
+        self._saved_cookies = None
+        self._sid = None
+        self._user_id = None
 
         self.headers.update(DEFAULT_HEADERS)
 
     def request(self, method, url, **kwargs) -> requests.Response:
         if url.startswith("https://") or url.startswith("http://"):
             print(f"GOT HTTP REQUEST in PhpBBSession.request: {method} {url}")
-            return super().request(method, url, **kwargs)
+        else:
+            parsed_url = urlparse(self._base_url)
+            hostname = parsed_url.netloc
+
+            new_url = f"{parsed_url.scheme}://{hostname}{parsed_url.path}{url}"
+            url = new_url
+
+        response = super().request(method, url, **kwargs)
+
+        self.save_session()
 
-        parsed_url = urlparse(self._base_url)
-        hostname = parsed_url.netloc
+        return response
 
-        new_url = f"{parsed_url.scheme}://{hostname}{parsed_url.path}{url}"
-        url = new_url
+    def _refresh_cookies(self) -> None:
+        """
+        Re-reads sid and user_id if the cookies changed.
+        """
+        if self.cookies.version == self._cookies_version:
+            return
 
-        return super().request(method, url, **kwargs)
+        self._cookies_version = self.cookies.version
+        self._sid = None
+        self._user_id = None
+
+        for key, value in self.cookies.items():
+            if not key.startswith("phpbb3_"):
+                continue
+
+            if key.endswith("_sid") and self._sid is None:
+                self._sid = value
+            elif key.endswith("_u") and self._user_id is None:
+                self._user_id = int(value)
 
     def save_session(self):
-        # log.debug('Saving session!')
+        """
+        Writes the cookies to PHPBB_SESSION_FILE if they changed since the last save.
+        """
+        if self.cookies.version == self._saved_cookies_version:
+            return
+
+        self._saved_cookies_version = self.cookies.version
+
+        cookies = sorted(self.cookies.items())
+        if cookies == self._saved_cookies:
+            return
 
-        cookies = msgpack.dumps(self.cookies.items())
-        with open(PHPBB_SESSION_FILE, "wb+") as fp:
-            fp.write(cookies)
+        atomic_write(PHPBB_SESSION_FILE, msgpack.dumps(cookies))
+        self._saved_cookies = cookies
 
     def load_session(self) -> bool:
         try:
@@ -94,23 +190,39 @@ class PhpBBSession(requests.Session):
 
         # log.debug(f'Restored cookies from session file, sid: {self.sid}')
 
+        self._saved_cookies_version = self.cookies.version
+        self._saved_cookies = sorted(self.cookies.items())
+
         return True
 
     @property
     def sid(self) -> t.Optional[str]:
-        for key, value in self.cookies.items():
-            if key.startswith("phpbb3_") and key.endswith("_sid"):
-                return value
-
-        return None
+        self._refresh_cookies()
+        return self._sid
 
     @property
     def user_id(self) -> t.Optional[int]:
-        for key, value in self.cookies.items():
-            if key.startswith("phpbb3_") and key.endswith("_u"):
-                return int(value)
+        self._refresh_cookies()
+        return self._user_id
 
-        return None
+
+class AsyncPhpBBSession(AsyncSession):
+    """
+    Async phpBB session used for scraping, sharing cookies with a logged in PhpBBSession.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("headers", DEFAULT_HEADERS)
+
+        super().__init__(*args, **kwargs)
+
+    @classmethod
+    def from_session(cls, session: PhpBBSession) -> "AsyncPhpBBSession":
+        return cls(
+            base_url=session._base_url,
+            cookies=dict(session.cookies.items()),
+            forced_ip=os.environ.get("PHPBB_IP"),
+        )
 
 
 class BanAction(enum.Enum):
@@ -146,6 +258,26 @@ class PhpBBPostRequest:
         return self.mode == "unapproved_topics"
 
 
+@dataclass
+class AdmSession:
+    session: PhpBBSession
+    sid: str
+    expires_at: float
+
+
+_adm_session = None
+_adm_session_lock = threading.Lock()
+
+
+def _wait_for_form_age(loaded_at: float) -> None:
+    """
+    Sleeps until a form loaded at loaded_at (time.monotonic()) is old enough to post.
+    """
+    remaining = PHPBB_FORM_MIN_AGE_SECONDS - (time.monotonic() - loaded_at)
+    if remaining > 0:
+        time.sleep(remaining)
+
+
 def _load_session(session: PhpBBSession) -> bool:
     try:
         with open(PHPBB_SESSION_FILE, "rb") as fp:
@@ -166,7 +298,7 @@ def _load_session(session: PhpBBSession) -> bool:
 
 def _validate_session(session: PhpBBSession) -> bool:
     response = session.get("/")
-    index_page = BeautifulSoup(response.text, features="html.parser")
+    index_page = parse_html(response.text)
 
     footer = index_page.find(id="wrapfooter")
     if footer and "[ Administration Control Panel ]" in footer.text:
@@ -220,8 +352,9 @@ def _login_to_phpbb(force_fresh: bool = False):
     # Reload again cuz phpbb is weird..
     response = session.get(url, params=params)
     assert response.status_code == 200
+    form_loaded_at = time.monotonic()
 
-    login_page = BeautifulSoup(response.text, features="html.parser")
+    login_page = parse_html(response.text)
 
     login_form_fields = None
     for form in login_page.body.find_all("form"):
@@ -234,14 +367,7 @@ def _login_to_phpbb(force_fresh: bool = False):
     if login_form_fields is None:
         raise PhpBBAuthError("Unable to find login form!")
 
-    # From phpBB/includes/functions.php:2070
-    #
-    # // If creation_time and the time() now is zero we can assume
-    #    it was not a human doing this (the check for if ($diff)...
-    #
-    # We basically have to sleep() for a bit during auth checks, otherwise
-    # the creation_time checker will kick us out.
-    time.sleep(3)
+    _wait_for_form_age(form_loaded_at)
 
     phpbb_username = os.environ["PHPBB_USERNAME"]
     phpbb_password = os.environ["PHPBB_PASSWORD"]
@@ -262,7 +388,7 @@ def _login_to_phpbb(force_fresh: bool = False):
     url = "/ucp.php"
     response = session.post(url, params=params, data=login_form)
 
-    logged_in_page = BeautifulSoup(response.text, features="html.parser")
+    logged_in_page = parse_html(response.text)
     footer = logged_in_page.find(id="wrapfooter")
     if not footer or "[ Administration Control Panel ]" not in footer.text:
         try:
@@ -285,6 +411,7 @@ def _extract_moderatable_post(row: Tag):
         "author_name": "",
         "author_url": "",
         "author_id": None,
+        "post_id": None,
         "post_time": "",
         # These are pulled in from a different function
         "post_ip_address": "",
@@ -300,6 +427,10 @@ def _extract_moderatable_post(row: Tag):
     topic_approval_request["topic_name"] = topic_title.text
     topic_approval_request["topic_url"] = topic_title.attrs["href"].removeprefix(".")
 
+    # The post ID is part of the topic link, so it's known before any details are loaded
+    query_args = parse_qs(urlparse(topic_approval_request["topic_url"]).query)
+    topic_approval_request["post_id"] = int(query_args["p"][0])
+
     forum_info_cell = topic_info_cell.select_one("span")
     topic_approval_request["forum_name"] = forum_info_cell.text.removeprefix("Forum: ")
     topic_approval_request["forum_url"] = (
@@ -329,7 +460,91 @@ def _extract_moderatable_post(row: Tag):
     return topic_approval_request
 
 
-def _extract_user_details(session: PhpBBSession, topic_approval_request: dict):
+async def _parse_page(
+    text: str, parse_only: t.Optional[SoupStrainer] = None
+) -> BeautifulSoup:
+    # Parsing a full phpBB page is CPU heavy, so keep it off the event loop.
+    return await run_in_background(parse_html, text, parse_only=parse_only)
+
+
+async def _login_to_phpbb_async(force_fresh: bool = False) -> AsyncPhpBBSession:
+    session, logged_in = await run_in_background(
+        _login_to_phpbb, force_fresh=force_fresh
+    )
+
+    return AsyncPhpBBSession.from_session(session)
+
+
+def _load_cached_user_details(author_id: int) -> t.Optional[dict]:
+    expires_before = arrow.utcnow().shift(seconds=-PHPBB_USER_PROFILE_TTL_SECONDS)
+
+    with bot_session() as session:
+        profile = (
+            session.query(PhpbbUserProfile).filter_by(author_id=author_id).one_or_none()
+        )
+
+        if not profile or arrow.get(profile.time_fetched) < expires_before:
+            return None
+
+        return {
+            "user_join_date": arrow.get(profile.user_join_date),
+            "user_warning_count": profile.user_warning_count,
+            "user_post_count": profile.user_post_count,
+            "user_group_list": profile.user_group_list,
+        }
+
+
+def _cache_user_details(author_id: int, user_details: dict) -> None:
+    with bot_session() as session:
+        profile = (
+            session.query(PhpbbUserProfile).filter_by(author_id=author_id).one_or_none()
+        ) or PhpbbUserProfile(author_id=author_id)
+
+        profile.user_join_date = user_details["user_join_date"].datetime
+        profile.user_warning_count = user_details["user_warning_count"]
+        profile.user_post_count = user_details["user_post_count"]
+        profile.user_group_list = user_details["user_group_list"]
+        profile.time_fetched = arrow.utcnow().datetime
+
+        session.add(profile)
+        session.commit()
+
+
+def invalidate_user_profile(author_id: int) -> None:
+    """
+    Drops the cached profile for author_id so it's loaded again for their next queued post.
+
+    Call this whenever their post or warning count may have changed.
+    """
+    with bot_session() as session:
+        session.query(PhpbbUserProfile).filter_by(author_id=author_id).delete()
+        session.commit()
+
+
+async def _extract_user_details(
+    session: AsyncPhpBBSession, topic_approval_request: dict
+):
+    author_id = topic_approval_request["author_id"]
+
+    if user_details := await run_in_background(_load_cached_user_details, author_id):
+        return user_details
+
+    if not (profile_load := _user_profile_loads.get(author_id)):
+        profile_load = asyncio.ensure_future(
+            _load_user_details(session, author_id, topic_approval_request["author_url"])
+        )
+        profile_load.add_done_callback(
+            lambda _: _user_profile_loads.pop(author_id, None)
+        )
+        _user_profile_loads[author_id] = profile_load
+
+    # Shielded so one enrichment being cancelled doesn't fail the others waiting on it
+    return dict(await asyncio.shield(profile_load))
+
+
+async def _load_user_details(
+    session: AsyncPhpBBSession, author_id: int, author_url: str
+):
     user_details = {
         "user_join_date": "",
         "user_warning_count": "",
@@ -337,10 +552,10 @@ def _extract_user_details(session: PhpBBSession, topic_approval_request: dict):
         "user_group_list": "",
     }
 
-    author_response = session.get(topic_approval_request["author_url"])
+    author_response = await session.get(author_url)
     assert author_response.ok
 
-    author_page = BeautifulSoup(author_response.text, features="html.parser")
+    author_page = await _parse_page(author_response.text, parse_only=FORM_STRAINER)
 
     user_stats = author_page.find_all("form")[0].find_all(class_="row1")[1]
     join_date_text = user_stats.select("tr")[0].select("td")[1].text
@@ -368,6 +583,8 @@ def _extract_user_details(session: PhpBBSession, topic_approval_request: dict):
     group_list = ", ".join([c.text for c in groups_cell.select("select")[0].children])
     user_details["user_group_list"] = group_list
 
+    await run_in_background(_cache_user_details, author_id, user_details)
+
     return user_details
 
 
@@ -377,7 +594,9 @@ def _replace_unicode(text: str) -> str:
     )
 
 
-def _extract_post_details(session: PhpBBSession, topic_approval_request: dict):
+async def _extract_post_details(
+    session: AsyncPhpBBSession, topic_approval_request: dict
+):
     post_details = {
         "post_id": None,
         "post_text": "",
@@ -387,16 +606,15 @@ def _extract_post_details(session: PhpBBSession, topic_approval_request: dict):
         "post_ip_organization": "",
     }
 
-    query_args = parse_qs(urlparse(topic_approval_request["topic_url"]).query)
-    post_id = int(query_args["p"][0])
+    post_id = topic_approval_request["post_id"]
     post_details["post_id"] = post_id
 
     # Pull more details on the post itself (IP & content)
     moderate_post_view_url = f"/mcp.php?i=queue&mode=approve_details&p={post_id}"
-    moderate_post_response = session.get(moderate_post_view_url)
+    moderate_post_response = await session.get(moderate_post_view_url)
     assert moderate_post_response.ok
-    moderate_post_page = BeautifulSoup(
-        moderate_post_response.text, features="html.parser"
+    moderate_post_page = await _parse_page(
+        moderate_post_response.text, parse_only=FORM_STRAINER
     )
 
     if not (post_moderation_form := moderate_post_page.select_one("form")):
@@ -426,17 +644,15 @@ def _extract_post_details(session: PhpBBSession, topic_approval_request: dict):
     post_details["post_text"] = _replace_unicode(str(inner_post_block))
     post_details["post_ip_address"] = post_ip_address
 
-    ipinfo = get_ip_address_info(post_ip_address)
-    if not ipinfo:
-        return post_details
+    return post_details
+
 
-    post_details["post_ip_hostname"] = ipinfo.get("hostname")
-    post_details["post_ip_location"] = (
+def _apply_ip_address_info(topic_approval_request: dict, ipinfo: dict) -> None:
+    topic_approval_request["post_ip_hostname"] = ipinfo.get("hostname")
+    topic_approval_request["post_ip_location"] = (
         f"{ipinfo['city']} {ipinfo['region']} {ipinfo['country']}"
     )
-    post_details["post_ip_organization"] = ipinfo["org"]
-
-    return post_details
+    topic_approval_request["post_ip_organization"] = ipinfo["org"]
 
 
 def _extract_last_approved_post_date(page: BeautifulSoup) -> t.Optional[arrow.Arrow]:
@@ -465,55 +681,109 @@ def _extract_last_approved_post_date(page: BeautifulSoup) -> t.Optional[arrow.Ar
     return None
 
 
-def _extract_topic_details(session: PhpBBSession, topic_approval_request: dict):
+def _extract_topic_pagination(page: BeautifulSoup) -> t.Tuple[int, int]:
+    page_x_of_y_cell = page.find(class_="nav", valign="middle", nowrap="nowrap")
+
+    this_page, last_page = PAGE_PAT.search(page_x_of_y_cell.text[1:]).groups()
+
+    return int(this_page), int(last_page)
+
+
+def _extract_topic_post_count(page: BeautifulSoup) -> t.Optional[int]:
+    if not (post_count_match := POST_COUNT_PAT.search(page.text)):
+        return None
+
+    return int(post_count_match.group(1))
+
+
+def _cache_last_approved_post_date(
+    topic_id: int, post_count: t.Optional[int], last_post_date: arrow.Arrow
+) -> None:
+    # Without a post count there's nothing to invalidate the entry with
+    if post_count is None:
+        return
+
+    _last_approved_post_dates.pop(topic_id, None)
+    _last_approved_post_dates[topic_id] = (post_count, last_post_date)
+
+    while len(_last_approved_post_dates) > PHPBB_TOPIC_CACHE_SIZE:
+        del _last_approved_post_dates[next(iter(_last_approved_post_dates))]
+
+
+def _remember_queued_post_topic(post_id: t.Optional[int], topic_id: int) -> None:
+    if post_id is None:
+        return
+
+    _queued_post_topics.pop(post_id, None)
+    _queued_post_topics[post_id] = topic_id
+
+    while len(_queued_post_topics) > PHPBB_TOPIC_CACHE_SIZE:
+        del _queued_post_topics[next(iter(_queued_post_topics))]
+
+
+def forget_moderated_post(post_id: int) -> None:
+    """
+    Drops the cached last approved post date for post_id's topic.
+
+    Approving one queued reply and rejecting another changes the date without changing
+    the topic's post count, so call this whenever a queued post is moderated.
+    """
+    if (topic_id := _queued_post_topics.pop(post_id, None)) is not None:
+        _last_approved_post_dates.pop(topic_id, None)
+
+
+async def _extract_topic_details(
+    session: AsyncPhpBBSession, topic_approval_request: dict
+):
     topic_details = {
         "last_approved_post_date": "",
     }
 
+    # The post link lands on the page holding the queued reply, which is usually the last
+    # page of the topic already.
     topic_url = topic_approval_request["topic_url"]
-    topic_response = session.get(topic_url)
+    topic_response = await session.get(topic_url)
     assert topic_response.ok
 
-    topic_page = BeautifulSoup(topic_response.text, features="html.parser")
+    topic_page = await _parse_page(topic_response.text)
 
     topic_href = topic_page.find(id="pageheader").select_one("a").attrs["href"]
     topic_id = int(parse_qs(urlparse(topic_href).query)["t"][0])
 
-    topic_url = "/viewtopic.php"
-    topic_params = {
-        "t": topic_id,
-    }
+    _remember_queued_post_topic(topic_approval_request.get("post_id"), topic_id)
 
-    topic_response = session.get(topic_url, params=topic_params)
-    assert topic_response.ok
+    post_count = _extract_topic_post_count(topic_page)
 
-    topic_page = BeautifulSoup(topic_response.text, features="html.parser")
-    page_x_of_y_text = topic_page.find(
-        class_="nav", valign="middle", nowrap="nowrap"
-    ).text[1:]
+    cached = _last_approved_post_dates.get(topic_id)
+    if cached and post_count is not None and cached[0] == post_count:
+        topic_details["last_approved_post_date"] = cached[1]
+        return topic_details
 
-    PAGE_PAT = re.compile(r"Page (\d+) of (\d+)")
-    this_page, last_page = PAGE_PAT.search(page_x_of_y_text).groups()
+    this_page, last_page = _extract_topic_pagination(topic_page)
 
-    for cur_page_number_neg in range(-int(last_page), 0):
-        start_at = (abs(cur_page_number_neg) * 10) - 10
+    # Jump straight to the last page and walk backwards from there
+    for page_number in range(last_page, 0, -1):
+        if page_number != this_page:
+            start_at = (page_number - 1) * PHPBB_POSTS_PER_PAGE
 
-        topic_url = "/viewtopic.php"
-        topic_params = {
-            "t": topic_id,
-        }
-        if start_at:
-            topic_params["start"] = start_at
+            topic_url = "/viewtopic.php"
+            topic_params = {
+                "t": topic_id,
+            }
+            if start_at:
+                topic_params["start"] = start_at
 
-        topic_response = session.get(topic_url, params=topic_params)
-        assert topic_response.ok
+            topic_response = await session.get(topic_url, params=topic_params)
+            assert topic_response.ok
 
-        topic_page = BeautifulSoup(topic_response.text, features="html.parser")
+            topic_page = await _parse_page(topic_response.text)
 
         last_post_date = _extract_last_approved_post_date(topic_page)
         if not last_post_date:
             continue
 
+        _cache_last_approved_post_date(topic_id, post_count, last_post_date)
+
         topic_details["last_approved_post_date"] = last_post_date
         return topic_details
 
@@ -521,29 +791,88 @@ def _extract_topic_details(session: PhpBBSession, topic_approval_request: dict):
     return {}
 
 
-def _load_posts_topics_awaiting_approval(
-    session: PhpBBSession,
+async def _enrich_moderatable_post(
+    session: AsyncPhpBBSession, topic_approval_request: dict, mode: str
+) -> t.Optional[dict]:
+    """
+    Pulls in the post, author and topic details for a queued post. The pages are
+    independent of each other so they're fetched at the same time.
+    """
+    detail_coros = [
+        _extract_post_details(session, topic_approval_request),
+        _extract_user_details(session, topic_approval_request),
+    ]
+
+    if mode == "unapproved_posts":
+        detail_coros.append(_extract_topic_details(session, topic_approval_request))
+
+    post_details, *other_details = await asyncio.gather(
+        *detail_coros, return_exceptions=True
+    )
+
+    if isinstance(post_details, IndexError):
+        print(f"Failed to get info for {topic_approval_request}")
+        print(f"exc={post_details!r}")
+        return None
+
+    if isinstance(post_details, BaseException):
+        raise post_details
+
+    if not post_details:
+        return None
+
+    topic_approval_request.update(post_details)
+
+    for details in other_details:
+        if isinstance(details, BaseException):
+            raise details
+
+        topic_approval_request.update(details)
+
+    topic_approval_request["mode"] = mode
+
+    return topic_approval_request
+
+
+async def _load_posts_topics_awaiting_approval(
+    session: AsyncPhpBBSession,
     mode: str,
+    known_post_ids: t.Optional[t.Collection[int]] = None,
     retried: bool = False,
 ) -> t.List[PhpBBPostRequest]:
+    """
+    Loads the moderation queue for mode.
+
+    Rows whose post ID is in known_post_ids are returned as listed in the queue without
+    loading their post, author or topic details, since they're already tracked.
+    """
+    known_post_ids = known_post_ids or set()
+
     url = f"/mcp.php?i=mcp_queue&mode={mode}"
-    response = session.get(url)
+    response = await session.get(url)
     assert response.ok, response.status_code
 
     posts_awaiting_approval = []
 
-    approvals_page = BeautifulSoup(response.text, features="html.parser")
+    approvals_page = await _parse_page(response.text, parse_only=MCP_STRAINER)
 
     mcp_cell = approvals_page.find(id="mcp")
     if not mcp_cell:
+        # Not logged in, the rest of the page explains why
+        approvals_page = await _parse_page(response.text)
         header_cell = approvals_page.find("h2")
         if header_cell and header_cell.text == "To moderate this forum you must login.":
-            session, logged_in = _login_to_phpbb(force_fresh=True)
-            return _load_posts_topics_awaiting_approval(
-                session=session, mode=mode, retried=True
+            session = await _login_to_phpbb_async(force_fresh=True)
+            return await _load_posts_topics_awaiting_approval(
+                session=session,
+                mode=mode,
+                known_post_ids=known_post_ids,
+                retried=True,
             )
         raise PhpBBAuthError("Unable to access moderator control panel!")
 
+    topic_approval_requests = []
+
     trs = mcp_cell.select("tr")
     for tr in trs:
         css_classes = set(tr.attrs.get("class", []))
@@ -551,37 +880,59 @@ def _load_posts_topics_awaiting_approval(
             continue
 
         topic_approval_request = _extract_moderatable_post(tr)
+        topic_approval_request["mode"] = mode
 
-        try:
-            if not (
-                post_details := _extract_post_details(session, topic_approval_request)
-            ):
-                continue
-        except IndexError as exc:
-            print(f"Failed to get info for {topic_approval_request}")
-            print(f"{exc=}")
-            continue
+        topic_approval_requests.append(topic_approval_request)
 
-        topic_approval_request.update(post_details)
+    # Rows are enriched concurrently, gather() keeps them in queue order.
+    semaphore = asyncio.Semaphore(PHPBB_ENRICH_CONCURRENCY)
 
-        user_details = _extract_user_details(session, topic_approval_request)
-        topic_approval_request.update(user_details)
+    async def _enrich_with_limit(topic_approval_request: dict) -> t.Optional[dict]:
+        if topic_approval_request["post_id"] in known_post_ids:
+            return topic_approval_request
 
-        if mode == "unapproved_posts":
-            topic_details = _extract_topic_details(session, topic_approval_request)
-            topic_approval_request.update(topic_details)
+        async with semaphore:
+            return await _enrich_moderatable_post(session, topic_approval_request, mode)
 
-        topic_approval_request["mode"] = mode
+    enriched_requests = await asyncio.gather(
+        *[
+            _enrich_with_limit(topic_approval_request)
+            for topic_approval_request in topic_approval_requests
+        ]
+    )
+
+    for topic_approval_request in enriched_requests:
+        if not topic_approval_request:
+            continue
 
         posts_awaiting_approval.append(topic_approval_request)
 
+    # IPs are looked up together once every post is loaded so they can share a batch.
+    new_posts = [
+        topic_approval_request
+        for topic_approval_request in posts_awaiting_approval
+        if topic_approval_request["post_id"] not in known_post_ids
+        and topic_approval_request["post_ip_address"]
+    ]
+    ip_address_info = await run_in_background(
+        get_ip_addresses_info,
+        [
+            topic_approval_request["post_ip_address"]
+            for topic_approval_request in new_posts
+        ],
+    )
+
+    for topic_approval_request in new_posts:
+        if ipinfo := ip_address_info.get(topic_approval_request["post_ip_address"]):
+            _apply_ip_address_info(topic_approval_request, ipinfo)
+
     return posts_awaiting_approval
 
 
 def _approve_moderated_post(
     session: PhpBBSession, response: requests.Response, post_id: int
 ) -> bool:
-    moderate_post = BeautifulSoup(response.text, features="html.parser")
+    moderate_post = parse_html(response.text)
 
     moderate_form = moderate_post.select("form")[0]
     moderate_form_fields = _extract_form_fields(moderate_form)
@@ -616,10 +967,7 @@ def _approve_moderated_post(
         data=form_data,
     )
 
-    confirm_moderate_post = BeautifulSoup(
-        confirm_moderate_post_response.text,
-        features="html.parser",
-    )
+    confirm_moderate_post = parse_html(confirm_moderate_post_response.text)
 
     response_text = None
 
@@ -644,7 +992,7 @@ def _reject_moderated_post(
     rejection_category: int,
     rejection_reason: str,
 ) -> bool:
-    moderate_post = BeautifulSoup(response.text, features="html.parser")
+    moderate_post = parse_html(response.text)
 
     moderate_form = moderate_post.select("form")[0]
     moderate_form_fields = _extract_form_fields(moderate_form)
@@ -687,10 +1035,7 @@ def _reject_moderated_post(
         data=form_data,
     )
 
-    confirm_moderate_post = BeautifulSoup(
-        confirm_moderate_post_response.text,
-        features="html.parser",
-    )
+    confirm_moderate_post = parse_html(confirm_moderate_post_response.text)
 
     response_text = None
 
@@ -759,17 +1104,17 @@ def _moderate_post(
 def _login_to_adm(
     session: PhpBBSession,
     retried: bool = False,
-):
+) -> t.Optional[PhpBBSession]:
+    """
+    Re-authenticates session for the ACP, returning the session that ended up signed in.
+    """
     index_url = "/index.php"
 
     response = session.get(index_url)
 
     log.debug(response.status_code)
 
-    index_page = BeautifulSoup(
-        response.text,
-        features="html.parser",
-    )
+    index_page = parse_html(response.text)
 
     try:
         adm_href = (
@@ -790,20 +1135,18 @@ def _login_to_adm(
         session_id = parse_qs(urlparse(adm_href).query)["sid"][0]
     except Exception as exc:
         log.error(f"Unable to exctract adm sid: {exc}")
-        return False
+        return None
 
     url = "/adm/index.php"
     params = {
         "sid": session_id,
     }
     response = session.get(url, params=params)
+    form_loaded_at = time.monotonic()
 
     log.debug(response.status_code)
 
-    acp_page = BeautifulSoup(
-        response.text,
-        features="html.parser",
-    )
+    acp_page = parse_html(response.text)
 
     reauth_form_html = acp_page.select_one("form")
 
@@ -812,7 +1155,7 @@ def _login_to_adm(
         message = reauth_form_html.select_one("th").text
         if message != "To administer the board you must re-authenticate yourself.":
             log.debug("Didn't find to administer message!")
-            return True
+            return session
     except Exception as exc:
         is_in_adm = acp_page.select_one("h1").text == "Administration Control Panel"
 
@@ -821,18 +1164,11 @@ def _login_to_adm(
         else:
             log.error(f"Failed to find re-admin message: {exc}")
 
-        return True
+        return session
 
     # TODO: Check if there's a need to login again
 
-    # From phpBB/includes/functions.php:2070
-    #
-    # // If creation_time and the time() now is zero we can assume
-    #    it was not a human doing this (the check for if ($diff)...
-    #
-    # We basically have to sleep() for a bit during auth checks, otherwise
-    # the creation_time checker will kick us out.
-    time.sleep(3)
+    _wait_for_form_age(form_loaded_at)
 
     in_form_fields = _extract_form_fields(reauth_form_html)
 
@@ -858,7 +1194,7 @@ def _login_to_adm(
     reauth_response = session.post(url, params=params, data=reauth_form)
     assert reauth_response.ok
 
-    adm_page = BeautifulSoup(reauth_response.text, features="html.parser")
+    adm_page = parse_html(reauth_response.text)
 
     header_div = adm_page.select_one("h1")
 
@@ -876,7 +1212,7 @@ def _login_to_adm(
 
     if is_in_adm:
         log.debug("in ADM!!!")
-        return True
+        return session
 
     try:
         sign_in_error_text = adm_page.select_one("form").find(class_="error").text
@@ -890,7 +1226,48 @@ def _login_to_adm(
     else:
         raise PhpBBADMError(sign_in_error_text)
 
-    return False
+    return None
+
+
+def _get_adm_session() -> t.Optional[PhpBBSession]:
+    """
+    Returns a session signed in to the ACP, reusing the last one until it expires or
+    _invalidate_adm_session() is called because phpBB rejected it.
+    """
+    global _adm_session
+
+    with _adm_session_lock:
+        now = time.monotonic()
+
+        if (
+            _adm_session
+            and now < _adm_session.expires_at
+            and _adm_session.session.sid == _adm_session.sid
+        ):
+            return _adm_session.session
+
+        _adm_session = None
+
+        session, logged_in = _login_to_phpbb()
+
+        if not (session := _login_to_adm(session)):
+            return None
+
+        _adm_session = AdmSession(
+            session=session,
+            sid=session.sid,
+            expires_at=now + PHPBB_ADM_SESSION_TTL_SECONDS,
+        )
+
+        return session
+
+
+def _invalidate_adm_session(session: PhpBBSession) -> None:
+    global _adm_session
+
+    with _adm_session_lock:
+        if _adm_session and _adm_session.session is session:
+            _adm_session = None
 
 
 def _ban_user(
@@ -908,20 +1285,19 @@ def _ban_user(
         "sid": session.sid,
     }
     response = session.get(index_url, params=params)
+    form_loaded_at = time.monotonic()
 
     log.debug(response.status_code)
 
-    user_page = BeautifulSoup(
-        response.text,
-        features="html.parser",
-    )
+    user_page = parse_html(response.text)
 
     user_quick_tools = user_page.find(id="user_quick_tools")
     if not user_quick_tools:
         if retried is False:
-            session2, logged_in2 = _login_to_phpbb()
+            # phpBB no longer accepts the cached ACP session
+            _invalidate_adm_session(session)
 
-            if not _login_to_adm(session2):
+            if not (session2 := _get_adm_session()):
                 log.error("failed to sign in to ADM in _ban_user")
                 return False
 
@@ -966,22 +1342,12 @@ def _ban_user(
         "form_token": quick_actions_form_fields["form_token"],
     }
 
-    # From phpBB/includes/functions.php:2070
-    #
-    # // If creation_time and the time() now is zero we can assume
-    #    it was not a human doing this (the check for if ($diff)...
-    #
-    # We basically have to sleep() for a bit during auth checks, otherwise
-    # the creation_time checker will kick us out.
-    time.sleep(3)
+    _wait_for_form_age(form_loaded_at)
 
     ban_response = session.post(ban_url, params=ban_params, data=ban_data)
     assert ban_response.ok
 
-    ban_page_result_div = BeautifulSoup(
-        ban_response.text,
-        features="html.parser",
-    )
+    ban_page_result_div = parse_html(ban_response.text)
 
     ban_message_div = ban_page_result_div.find("div", {"class": "main"}).select_one("p")
     ban_message = ban_message_div.text.removesuffix(" Back to previous page")[:-1]
@@ -994,13 +1360,7 @@ def _ban_user(
     return False
 
 
-def unban_username(username: str):
-    session, logged_in = _login_to_phpbb()
-
-    if not _login_to_adm(session):
-        log.error("failed to sign in to ADM")
-        return
-
+def _unban_username(session: PhpBBSession, username: str, retried: bool = False):
     index_url = "/adm/index.php"
     params = {
         "i": "acp_ban",
@@ -1008,15 +1368,26 @@ def unban_username(username: str):
         "sid": session.sid,
     }
     response = session.get(index_url, params=params)
+    form_loaded_at = time.monotonic()
 
     log.debug(response.status_code)
 
-    ban_page = BeautifulSoup(
-        response.text,
-        features="html.parser",
-    )
+    ban_page = parse_html(response.text)
+
+    if not (unban_div := ban_page.find(id="acp_unban")):
+        if retried:
+            log.error("Unable to find unban form!!")
+            return False
+
+        # phpBB no longer accepts the cached ACP session
+        _invalidate_adm_session(session)
+
+        if not (session2 := _get_adm_session()):
+            log.error("failed to sign in to ADM in _unban_username")
+            return False
+
+        return _unban_username(session=session2, username=username, retried=True)
 
-    unban_div = ban_page.find(id="acp_unban")
     unban_form = _extract_form_fields(unban_div)
     select_options = unban_div.find("select", {"name": "unban[]"})
 
@@ -1045,15 +1416,12 @@ def unban_username(username: str):
         "form_token": unban_form["form_token"],
     }
 
-    time.sleep(3)
+    _wait_for_form_age(form_loaded_at)
 
     unban_response = session.post(index_url, params=unban_params, data=unban_data)
     assert unban_response.ok
 
-    unban_page = BeautifulSoup(
-        unban_response.text,
-        features="html.parser",
-    )
+    unban_page = parse_html(unban_response.text)
 
     unban_message_div = unban_page.find("div", {"class": "main"}).select_one("p")
     unban_message = unban_message_div.text.removesuffix(" Back to previous page")[:-1]
@@ -1066,14 +1434,20 @@ def unban_username(username: str):
     return False
 
 
+def unban_username(username: str):
+    if not (session := _get_adm_session()):
+        log.error("failed to sign in to ADM")
+        return
+
+    return _unban_username(session=session, username=username)
+
+
 def ban_user_by_username(
     user_id: int,
     reviewer_name: str,
     reason_shown: str,
 ) -> bool:
-    session, logged_in = _login_to_phpbb()
-
-    if not _login_to_adm(session):
+    if not (session := _get_adm_session()):
         log.error("failed to sign in to ADM")
         return False
 
@@ -1086,23 +1460,29 @@ def ban_user_by_username(
     )
 
 
-def load_topics_awaiting_approval():
-    session, logged_in = _login_to_phpbb()
+async def load_topics_awaiting_approval(
+    known_post_ids: t.Optional[t.Collection[int]] = None,
+):
+    session = await _login_to_phpbb_async()
 
-    topics_awaiting_approval = _load_posts_topics_awaiting_approval(
+    topics_awaiting_approval = await _load_posts_topics_awaiting_approval(
         session=session,
         mode="unapproved_topics",
+        known_post_ids=known_post_ids,
     )
 
     return topics_awaiting_approval
 
 
-def load_posts_awaiting_approval():
-    session, logged_in = _login_to_phpbb()
+async def load_posts_awaiting_approval(
+    known_post_ids: t.Optional[t.Collection[int]] = None,
+):
+    session = await _login_to_phpbb_async()
 
-    posts_awaiting_approval = _load_posts_topics_awaiting_approval(
+    posts_awaiting_approval = await _load_posts_topics_awaiting_approval(
         session=session,
         mode="unapproved_posts",
+        known_post_ids=known_post_ids,
     )
 
     return posts_awaiting_approval
@@ -2,11 +2,17 @@ import logging
 import os
 
 import discord
-from discord.errors import NotFound
 
 from arsbot.core.db import bot_session
 from arsbot.models import PhpbbPostRequest
 
+from ..outbound import outbound_dispatcher, Priority
+from ..pending_requests import get_pending_request_index
+from ..utils import (
+    delete_messages,
+    iter_history_pages,
+)
+
 
 log = logging.getLogger("arsbot")
 
@@ -106,30 +112,36 @@ def _make_forum_post_embed(post_request):
     return embed
 
 
-async def get_requests_from_channel(client, channel, view):
+async def get_requests_from_channel(channel):
     """
-    Syncs bot-generated phpbb moderation messages from our database with a Discord view
-    so the buttons can be re-connected to the handle_approve and handle_deny callbacks.
+    Matches the phpbb moderation messages in the channel with our database, deleting any
+    message that isn't attached to a request.
+
+    Returns the post id -> message id of every request found in the channel, views are
+    registered for them through PendingRequestIndex.register_views().
     """
     known_request_ids = {}
 
     with bot_session() as session:
-        async for message in channel.history():
-            post_request = (
-                session.query(PhpbbPostRequest)
-                .filter_by(discord_message_id=message.id)
-                .one_or_none()
-            )
-
-            if not post_request:
-                log.info(
-                    f"Found message {message.id} in <#{channel.id}> not attached to a db entry, deleting"
+        async for messages in iter_history_pages(channel):
+            post_requests = {
+                post_request.discord_message_id: post_request
+                for post_request in session.query(PhpbbPostRequest).filter(
+                    PhpbbPostRequest.discord_message_id.in_(
+                        [message.id for message in messages]
+                    )
                 )
-                await message.delete()
-                continue
+            }
 
-            known_request_ids[post_request.post_id] = post_request
-            client.add_view(view, message_id=post_request.discord_message_id)
+            for message in messages:
+                if not (post_request := post_requests.get(message.id)):
+                    log.info(
+                        f"Found message {message.id} in <#{channel.id}> not attached to a db entry, deleting"
+                    )
+                    await message.delete()
+                    continue
+
+                known_request_ids[post_request.post_id] = message.id
 
     return known_request_ids
 
@@ -145,7 +157,9 @@ async def make_and_store_discord_request_message(post_request, channel, view):
 
     log.debug(f'Creating and sending new {item_type} request {post_request["post_id"]}')
 
-    message = await channel.send(embed=embed, view=view)
+    message = await outbound_dispatcher.send(
+        channel, embed=embed, view=view, priority=Priority.MODERATION
+    )
 
     post_request_record = PhpbbPostRequest(
         author_id=post_request["author_id"],
@@ -177,6 +191,8 @@ async def make_and_store_discord_request_message(post_request, channel, view):
         session.add(post_request_record)
         session.commit()
 
+    get_pending_request_index(channel.id).add(post_request["post_id"], message.id)
+
 
 async def purge_handled_requests(known_post_ids, channel):
     """
@@ -193,21 +209,25 @@ async def purge_handled_requests(known_post_ids, channel):
             .all()
         )
 
-        if handled_requests:
-            log.debug(f"{len(handled_requests)} handled requests pending prune")
+        if not handled_requests:
+            return
+
+        log.debug(f"{len(handled_requests)} handled requests pending prune")
+
+        await delete_messages(
+            channel,
+            [
+                handled_request.discord_message_id
+                for handled_request in handled_requests
+            ],
+        )
+
+        pending_requests = get_pending_request_index(channel.id)
 
         for handled_request in handled_requests:
             log.debug(f"Removing handled request {handled_request}")
 
-            try:
-                message = await channel.fetch_message(
-                    handled_request.discord_message_id
-                )
-                await message.delete()
-            except NotFound:
-                log.error(
-                    f"Tried to delete a message but its gone ({handled_request.discord_message_id}) {handled_request}"
-                )
-
+            pending_requests.discard_request(handled_request.post_id)
             session.delete(handled_request)
-            session.commit()
+
+        session.commit()
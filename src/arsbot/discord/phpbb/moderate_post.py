@@ -4,15 +4,19 @@ import arrow
 import discord
 
 from arsbot.core.db import bot_session
+from arsbot.core.executor import run_interactive
 from arsbot.models import PhpbbPostRequest
 
 from .api_client import (
     ban_user_by_username,
+    forget_moderated_post,
+    invalidate_user_profile,
     moderate_post,
 )
+from ..pending_requests import get_pending_request_index
 from ..utils import (
+    forum_log_digest,
     send_to_debug,
-    send_to_forum_log,
 )
 
 
@@ -47,14 +51,17 @@ async def handle_forum_ban(
 
         message = f"PHPBB user {request.author_name} has been banned by {reviewer_name}"
 
-        response = ban_user_by_username(
+        response = await run_interactive(
+            ban_user_by_username,
             user_id=request.author_id,
             reviewer_name=reviewer_name,
             reason_shown=moderator_response["public_ban_reason"],
         )
 
         if response:
-            await send_to_forum_log(message)
+            await run_interactive(invalidate_user_profile, request.author_id)
+
+            await forum_log_digest.add(message, reviewer_name)
             request.action = 2
             session.add(request)
             session.commit()
@@ -100,14 +107,21 @@ async def handle_forum_post(
         post_or_topic = "topic" if request.is_for_new_topic else "post"
         message = f"PHPBB {post_or_topic} for {request.author_name} {action} by {reviewer_name}"
 
-        response = moderate_post(
+        response = await run_interactive(
+            moderate_post,
             post_id=request.post_id,
             approve=approved,
             rejection_category=moderator_response["deny_reason_message"],
             rejection_reason=moderator_response["rejection_reason_category"],
         )
 
-        await send_to_forum_log(message)
+        if response:
+            # Approving or rejecting changes the author's post count and the topic's
+            # last approved post
+            await run_interactive(invalidate_user_profile, request.author_id)
+            forget_moderated_post(request.post_id)
+
+        await forum_log_digest.add(message, reviewer_name)
 
         request.time_resolved = arrow.utcnow().datetime
         request.action = 1 if approved else 0
@@ -118,5 +132,8 @@ async def handle_forum_post(
 
     if response:
         await interaction.message.delete()
+        get_pending_request_index(interaction.channel_id).discard_message(
+            interaction.message.id
+        )
 
     await interaction.response.defer()
@@ -1,11 +1,12 @@
-import asyncio
 import logging
 import os
+import typing as t
 
 from aiohttp.client_exceptions import ClientOSError
 from discord.errors import DiscordServerError
 
-from arsbot.core.lock import MESSAGE_LOCK
+from arsbot.core.lock import PHPBB_LOCK
+from arsbot.core.scheduler import Scheduler
 
 from .api_client import (
     load_posts_awaiting_approval,
@@ -19,10 +20,8 @@ from .channels import (
 from .moderate_post import handle_forum_post
 from .view import ModeratePostView
 from ..bot_listener import BotClient
-from ..const import (
-    NON_BOT_CLEAR_FREQUENCY_SECONDS,
-    SYNC_LOOP_DELAY,
-)
+from ..const import NON_BOT_CLEAR_FREQUENCY_SECONDS
+from ..pending_requests import get_pending_request_index, PendingRequestIndex
 from ..utils import delete_non_bot_messages
 
 
@@ -34,9 +33,9 @@ class TaskState:
         self.client = None
         self.moderation_channel_topics = None
         self.moderation_channel_posts = None
-        self.last_non_bot_message_check = None
-        self.last_phpbb_sync = None
         self.forum_moderate_view = None
+        self.pending_topics = None
+        self.pending_posts = None
 
 
 task_state = TaskState()
@@ -65,6 +64,17 @@ async def init_phpbb_task(client: BotClient):
         handle_phpbb_post_moderation_action=handle_forum_post,
     )
 
+    # Read the channel histories on the first sync after (re)starting
+    task_state.pending_topics = get_pending_request_index(
+        task_state.moderation_channel_topics.id
+    )
+    task_state.pending_topics.mark_stale()
+
+    task_state.pending_posts = get_pending_request_index(
+        task_state.moderation_channel_posts.id
+    )
+    task_state.pending_posts.mark_stale()
+
 
 async def _safe_delete(client: BotClient, channel) -> bool:
     try:
@@ -79,18 +89,40 @@ async def _safe_delete(client: BotClient, channel) -> bool:
         return False
 
 
-async def _sync_topic_approvals(now: float):
-    try:
-        known_request_ids = await get_requests_from_channel(
-            client=task_state.client,
-            channel=task_state.moderation_channel_topics,
-            view=task_state.forum_moderate_view,
+async def _get_known_request_ids(
+    channel, pending_requests: PendingRequestIndex, now: float
+) -> t.Optional[t.Set[int]]:
+    """
+    Returns the post ids that have a message in channel. The channel history is only read
+    when the pending request index needs to be reconciled.
+    """
+    if pending_requests.needs_reconcile(now):
+        try:
+            request_messages = await get_requests_from_channel(channel=channel)
+        except (DiscordServerError, ClientOSError) as exc:
+            log.exception(f"Failed to get channel requests: {exc}")
+            return None
+
+        pending_requests.reconcile(request_messages, now)
+        pending_requests.register_views(
+            task_state.client, task_state.forum_moderate_view
         )
-    except (DiscordServerError, ClientOSError) as exc:
-        log.exception(f"Failed to get channel requests: {exc}")
+
+    return pending_requests.request_ids()
+
+
+async def _sync_topic_approvals(now: float):
+    known_request_ids = await _get_known_request_ids(
+        channel=task_state.moderation_channel_topics,
+        pending_requests=task_state.pending_topics,
+        now=now,
+    )
+    if known_request_ids is None:
         return
 
-    pending_topics = load_topics_awaiting_approval()
+    pending_topics = await load_topics_awaiting_approval(
+        known_post_ids=known_request_ids
+    )
 
     known_post_ids = set()
     for post_request in pending_topics:
@@ -111,17 +143,17 @@ async def _sync_topic_approvals(now: float):
 
 
 async def _sync_post_approvals(now: float):
-    try:
-        known_request_ids = await get_requests_from_channel(
-            client=task_state.client,
-            channel=task_state.moderation_channel_posts,
-            view=task_state.forum_moderate_view,
-        )
-    except (DiscordServerError, ClientOSError) as exc:
-        log.exception(f"Failed to get channel requests: {exc}")
+    known_request_ids = await _get_known_request_ids(
+        channel=task_state.moderation_channel_posts,
+        pending_requests=task_state.pending_posts,
+        now=now,
+    )
+    if known_request_ids is None:
         return
 
-    pending_topics = load_posts_awaiting_approval()
+    pending_topics = await load_posts_awaiting_approval(
+        known_post_ids=known_request_ids
+    )
 
     known_post_ids = set()
     for post_request in pending_topics:
@@ -141,34 +173,40 @@ async def _sync_post_approvals(now: float):
     await purge_handled_requests(known_post_ids, task_state.moderation_channel_posts)
 
 
-async def run_phpbb_task_once(now: float):
-    last_check = task_state.last_non_bot_message_check
+async def run_phpbb_non_bot_purge(now: float) -> float:
+    if await _safe_delete(
+        client=task_state.client, channel=task_state.moderation_channel_topics
+    ):
+        await _safe_delete(
+            client=task_state.client, channel=task_state.moderation_channel_posts
+        )
 
-    if not last_check or now - last_check >= NON_BOT_CLEAR_FREQUENCY_SECONDS:
-        task_state.last_non_bot_message_check = now
+    return now + NON_BOT_CLEAR_FREQUENCY_SECONDS
 
-        if not await _safe_delete(
-            client=task_state.client, channel=task_state.moderation_channel_topics
-        ):
-            return
 
-        if not await _safe_delete(
-            client=task_state.client, channel=task_state.moderation_channel_posts
-        ):
-            return
+async def run_phpbb_sync(now: float) -> float:
+    async with PHPBB_LOCK:
+        await _sync_topic_approvals(now)
+        await _sync_post_approvals(now)
 
-    if (
-        task_state.last_phpbb_sync
-        and now - task_state.last_phpbb_sync < PHPBB_SYNC_FREQUENCY_SECONDS
-    ):
-        # TODO: Maybe return the amount of seconds we should wait in the main loop?
-        await asyncio.sleep(SYNC_LOOP_DELAY)
-        return
+    return now + PHPBB_SYNC_FREQUENCY_SECONDS
 
-    # log.debug('syncing phpbb')
 
-    task_state.last_phpbb_sync = now
+async def run_phpbb_integration(client: BotClient):
+    """
+    Runs the phpBB jobs on their own scheduler so a slow forum scrape only delays itself.
+    """
+    await init_phpbb_task(client)
 
-    async with MESSAGE_LOCK:
-        await _sync_topic_approvals(now)
-        await _sync_post_approvals(now)
+    scheduler = Scheduler()
+
+    scheduler.add_job(
+        "phpbb_non_bot_purge",
+        run_phpbb_non_bot_purge,
+        interval=NON_BOT_CLEAR_FREQUENCY_SECONDS,
+    )
+    scheduler.add_job(
+        "phpbb_sync", run_phpbb_sync, interval=PHPBB_SYNC_FREQUENCY_SECONDS
+    )
+
+    await scheduler.run_forever()
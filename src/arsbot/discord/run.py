@@ -17,19 +17,15 @@ from .bot_listener import (
     bot_state,
     client,
 )
-from .mediawiki.task import (
-    init_mediawiki_task,
-    run_mediawiki_task_once,
-)
-from .phpbb.task import (
-    init_phpbb_task,
-    run_phpbb_task_once,
-)
+from .mediawiki.task import run_mediawiki_integration
+from .outbound import outbound_dispatcher
+from .phpbb.task import run_phpbb_integration
 from .utils import (
     send_to_connect_channels,
     send_to_error,
 )
 from .voice_log import on_voice_state_update
+from ..core.http import close_client_session
 from ..utils.text_table import TextTable
 from ..version import (
     GIT_VERSION,
@@ -44,6 +40,8 @@ log = logging.getLogger("arsbot")
 instance_id = str(uuid.uuid4())
 started = time.time()
 
+INTEGRATION_RESTART_DELAY_SECONDS = 30
+
 
 class TaskFinished(Exception):
     pass
@@ -59,6 +57,47 @@ async def _wait_for_connection():
         await asyncio.sleep(0.1)
 
 
+async def _report_integration_failure(name: str, exc: Exception):
+    uptime_duration = str(timedelta(seconds=time.time() - started))
+
+    table = TextTable()
+
+    table.set_header("Integration Exception")
+    table.set_footer("End of integration exception")
+
+    table.add_key_value("instance_id", instance_id)
+    table.add_key_value("integration", name)
+    table.add_key_value("uptime_duration", uptime_duration)
+    table.add_key_value("error_message", repr(exc))
+
+    try:
+        await send_to_connect_channels(table.str())
+    except Exception:
+        log.exception(f"Unable to report {name} integration failure")
+
+
+async def supervise_integration(name: str, run_integration):
+    """
+    Keeps a single integration running, restarting it after a delay whenever it fails.
+
+    Integrations are supervised separately so an exception in one doesn't stop the others.
+    Failing jobs are handled by the scheduler, so this only restarts after init or the
+    scheduler itself fails.
+    """
+    while True:
+        try:
+            await run_integration(client)
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.exception(f"{name} integration failed: {exc}")
+            await _report_integration_failure(name, exc)
+        else:
+            log.error(f"{name} integration finished unexpectedly")
+
+        await asyncio.sleep(INTEGRATION_RESTART_DELAY_SECONDS)
+
+
 async def main_io_loop():
     """
     Main loop for doing all the things including:
@@ -66,20 +105,20 @@ async def main_io_loop():
     * Syncing account requests from MediaWiki
     * Syncing MediaWiki account requests to the #wiki-account-requests Discord channel
     * Removing non-bot and system messages from the #wiki-account-requests Discord channel
+    * Syncing the phpBB moderation queue to the forum moderation Discord channels
+
+    Each integration runs concurrently on its own scheduler and lock, so wiki latency
+    doesn't depend on how long the forum scrape takes.
     """
 
     await _wait_for_connection()
 
-    await init_mediawiki_task(client)
-    await init_phpbb_task(client)
-
-    while True:
-        now = time.time()
-
-        await run_mediawiki_task_once(now)
-        await run_phpbb_task_once(now)
+    outbound_dispatcher.start()
 
-        await asyncio.sleep(0.1)
+    await asyncio.gather(
+        supervise_integration("mediawiki", run_mediawiki_integration),
+        supervise_integration("phpbb", run_phpbb_integration),
+    )
 
 
 async def send_connect_message(local_client):
@@ -251,6 +290,9 @@ def runbot():
         keryboard_interrupt_tasks.add(task)
         await asyncio.wait(keryboard_interrupt_tasks)
 
+        await outbound_dispatcher.stop()
+        await close_client_session()
+
     try:
         loop.run_until_complete(create_tasks_func())
     except KeyboardInterrupt:
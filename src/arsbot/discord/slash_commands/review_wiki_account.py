@@ -13,8 +13,8 @@ from ..utils import (
     get_guild_ids,
     is_command_guild,
     is_wiki_stats_channel,
-    send_to_wiki_log,
     task_state,
+    wiki_log_digest,
 )
 
 
@@ -107,7 +107,7 @@ for config_guild_id in get_guild_ids():
             session.commit()
 
         message = f"{acrid} has been flagged for manual review by {interaction.user.display_name}"
-        await send_to_wiki_log(message)
+        await wiki_log_digest.add(message, interaction.user.display_name)
 
         message = f"{acrid} has been sent to <#{account_request.discord_channel_id}>"
         await interaction.response.send_message(message)
@@ -1,54 +1,91 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 import logging
 import os
+import weakref
 
-from discord.errors import Forbidden
+from discord.errors import Forbidden, HTTPException, NotFound
+import discord
 import requests
 
-from .bot_listener import client
+from .bot_listener import bot_state, client
+from .log_digest import LogDigest
+from .outbound import outbound_dispatcher, Priority
 
 
 log = logging.getLogger("arsbot")
 
+# Channel history is matched against the database this many messages at a time.
+HISTORY_PAGE_SIZE = 100
+
+# Discord only bulk deletes up to 100 messages that are less than 14 days old. Leave some
+# slack so a message doesn't age out between checking and deleting it.
+BULK_DELETE_BATCH_SIZE = 100
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=10)
+
 
 class TaskState:
     def __init__(self):
         self.client = None
         self.requests_channel = None
-        self.last_non_bot_message_check = None
-        self.last_mediawiki_sync = None
         self.approval_view = None
-        self.last_wiki_automod_execute_report = None
-
-    def try_check_non_bot_messages(self, now: int, frequency: int) -> bool:
-        if (
-            not self.last_non_bot_message_check
-            or now - self.last_non_bot_message_check >= frequency
-        ):
-            self.last_non_bot_message_check = now
-            return True
-
-        return False
+        self.pending_requests = None
+        self.next_full_account_walk = None
 
 
 task_state = TaskState()
 
+# client -> {channel id: channel} for channels that had to be fetched over REST
+_fetched_channels = weakref.WeakKeyDictionary()
+
+
+async def resolve_channel(client, channel_id):
+    """
+    Returns the channel for channel_id from the gateway cache, only falling back to
+    fetch_channel the first time a channel isn't cached there.
+    """
+    if channel := client.get_channel(int(channel_id)):
+        return channel
+
+    fetched_channels = _fetched_channels.setdefault(client, {})
+
+    if not (channel := fetched_channels.get(int(channel_id))):
+        channel = await client.fetch_channel(channel_id)
+        fetched_channels[int(channel_id)] = channel
+
+    return channel
+
+
+async def _forget_channel(client, channel_id: int):
+    if fetched_channels := _fetched_channels.get(client):
+        fetched_channels.pop(channel_id, None)
+
+
+bot_state.channel_change_hooks.append(_forget_channel)
+
 
 async def send_to_debug(message):
     channel_id = os.environ["DISCORD_BOT_DEBUG_CHANNEL"]
-    channel = await client.fetch_channel(channel_id)
-    await channel.send(message)
+    channel = await resolve_channel(client, channel_id)
+    await outbound_dispatcher.send(channel, message, priority=Priority.DEBUG)
 
 
-async def send_to_wiki_log(message):
+async def send_to_wiki_log(message=None, **kwargs):
     channel_id = os.environ["DISCORD_WIKI_LOGS_CHANNEL_ID"]
-    channel = await client.fetch_channel(channel_id)
-    return await channel.send(message)
+    channel = await resolve_channel(client, channel_id)
+    return await outbound_dispatcher.send(
+        channel, message, priority=Priority.LOG, **kwargs
+    )
 
 
-async def send_to_forum_log(message):
+async def send_to_forum_log(message=None, **kwargs):
     channel_id = os.environ["DISCORD_FORUM_LOGS_CHANNEL_ID"]
-    channel = await client.fetch_channel(channel_id)
-    await channel.send(message)
+    channel = await resolve_channel(client, channel_id)
+    await outbound_dispatcher.send(channel, message, priority=Priority.LOG, **kwargs)
+
+
+wiki_log_digest = LogDigest("Wiki log", send_to_wiki_log)
+forum_log_digest = LogDigest("Forum log", send_to_forum_log)
 
 
 def get_guild_ids() -> list[int]:
@@ -88,8 +125,10 @@ async def send_to_connect_channels(message, **kwargs):
         return
 
     for channel_id in channel_ids:
-        channel = await client.fetch_channel(channel_id)
-        await channel.send(message, **kwargs)
+        channel = await resolve_channel(client, channel_id)
+        await outbound_dispatcher.send(
+            channel, message, priority=Priority.LOG, **kwargs
+        )
 
 
 def send_to_error(message):
@@ -110,21 +149,107 @@ def send_to_error(message):
     log.error(response.status_code)
 
 
-async def delete_non_bot_messages(client, channel):
+async def iter_history_pages(channel, page_size: int = HISTORY_PAGE_SIZE):
     """
-    Deletes all messages in a given channel that were not authored by the current bot or Discord itself.
+    Yields a channel's history as lists of up to page_size messages, so each page can be
+    looked up in the database with a single query.
     """
+    page = []
+
     async for message in channel.history():
-        if client.user.id == message.author.id or message.author.system:
+        page.append(message)
+
+        if len(page) >= page_size:
+            yield page
+            page = []
+
+    if page:
+        yield page
+
+
+async def _delete_message(channel, message_id: int) -> bool:
+    try:
+        await channel.get_partial_message(message_id).delete()
+    except NotFound:
+        log.error(f"Tried to delete a message but its gone ({message_id})")
+        return False
+
+    return True
+
+
+async def delete_messages(channel, message_ids) -> int:
+    """
+    Deletes message_ids from channel without fetching the messages first.
+
+    Messages new enough are removed with bulk deletes of up to 100 at a time, older ones
+    are deleted one by one. Returns how many messages were deleted.
+    """
+    bulk_cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+
+    recent_ids = []
+    old_ids = []
+    for message_id in message_ids:
+        if discord.utils.snowflake_time(message_id) > bulk_cutoff:
+            recent_ids.append(message_id)
+        else:
+            old_ids.append(message_id)
+
+    deleted = 0
+
+    for index in range(0, len(recent_ids), BULK_DELETE_BATCH_SIZE):
+        batch = recent_ids[index : index + BULK_DELETE_BATCH_SIZE]
+
+        if len(batch) == 1:
+            old_ids.extend(batch)
             continue
 
         try:
-            await message.delete()
-            await send_to_debug(
-                f"Removed message {message.id} by {message.author.display_name} from <#{message.channel.id}>."
+            await channel.delete_messages(
+                [channel.get_partial_message(message_id) for message_id in batch]
             )
+            deleted += len(batch)
         except Forbidden:
-            await send_to_debug(
-                f"Unable to remove message {message.id} from {channel.name}: "
-                "Missing ~Permissions.manage_messages"
-            )
+            raise
+        except HTTPException as exc:
+            log.error(f"Bulk delete of {len(batch)} messages failed, retrying: {exc}")
+            old_ids.extend(batch)
+
+    for message_id in old_ids:
+        if await _delete_message(channel, message_id):
+            deleted += 1
+
+    return deleted
+
+
+async def delete_non_bot_messages(client, channel):
+    """
+    Deletes all messages in a given channel that were not authored by the current bot or Discord itself.
+    """
+    non_bot_messages = []
+
+    async for message in channel.history():
+        if client.user.id == message.author.id or message.author.system:
+            continue
+
+        non_bot_messages.append(message)
+
+    if not non_bot_messages:
+        return
+
+    try:
+        await delete_messages(channel, [message.id for message in non_bot_messages])
+    except Forbidden:
+        await send_to_debug(
+            f"Unable to remove {len(non_bot_messages)} messages from {channel.name}: "
+            "Missing ~Permissions.manage_messages"
+        )
+        return
+
+    authors = Counter(message.author.display_name for message in non_bot_messages)
+    author_summary = ", ".join(
+        f"{display_name} ({count})" for display_name, count in authors.most_common()
+    )
+
+    await send_to_debug(
+        f"Removed {len(non_bot_messages)} messages from <#{channel.id}> by {author_summary}."
+    )
@@ -3,16 +3,19 @@ import os
 
 import discord
 
+from .outbound import outbound_dispatcher, Priority
+from .utils import resolve_channel
+
 
 async def _safe_send(client: discord.Client, channel_id: int, embed: discord.Embed):
     try:
-        channel = await client.fetch_channel(channel_id)
+        channel = await resolve_channel(client, channel_id)
     except discord.errors.Forbidden as exc:
         print(f"Unable to fetch_channel for {channel_id}: {exc}")
         return
 
     try:
-        await channel.send(embed=embed)
+        await outbound_dispatcher.send(channel, embed=embed, priority=Priority.LOG)
     except discord.errors.Forbidden as exc:
         print(f"Unable to channel.send for {channel_id}: {exc}")
         return
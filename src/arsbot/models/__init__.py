@@ -1,2 +1,4 @@
 from .mediawiki_account_request import MediaWikiAccountRequest
 from .phpbb_post_request import PhpbbPostRequest
+from .phpbb_user_profile import PhpbbUserProfile
+from .ip_address_info import IpAddressInfo
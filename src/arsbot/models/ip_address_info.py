@@ -0,0 +1,31 @@
+import sqlalchemy as sa
+
+from .base import BotBase
+
+
+class IpAddressInfo(BotBase):
+    __tablename__ = "ip_address_info"
+
+    def __repr__(self) -> str:
+        return f"<IpAddressInfo {self.ip_address=} {self.time_fetched=}>"
+
+    id = sa.Column(
+        sa.Integer,
+        primary_key=True,
+    )
+    ip_address = sa.Column(
+        sa.String,
+        nullable=False,
+        unique=True,
+        doc="The IP address that was looked up.",
+    )
+    info = sa.Column(
+        sa.JSON,
+        nullable=False,
+        doc="The response from ipinfo.io for the IP address.",
+    )
+    time_fetched = sa.Column(
+        sa.DateTime,
+        nullable=False,
+        doc="When the IP address was looked up.",
+    )
@@ -5,6 +5,28 @@ from .base import BotBase
 
 class MediaWikiAccountRequest(BotBase):
     __tablename__ = "discord_mediawiki_account_requests"
+    __table_args__ = (
+        sa.Index(
+            "ix_discord_mediawiki_account_requests_discord_message_id",
+            "discord_message_id",
+            unique=True,
+        ),
+        sa.Index("ix_discord_mediawiki_account_requests_acrid", "acrid"),
+        # Requests still waiting on a moderator, used when purging handled requests
+        sa.Index(
+            "ix_discord_mediawiki_account_requests_unresolved",
+            "acrid",
+            sqlite_where=sa.text("time_resolved IS NULL"),
+            postgresql_where=sa.text("time_resolved IS NULL"),
+        ),
+        # Requests flagged by automod
+        sa.Index(
+            "ix_discord_mediawiki_account_requests_automod",
+            "acrid",
+            sqlite_where=sa.text("automod_spam_categories IS NOT NULL"),
+            postgresql_where=sa.text("automod_spam_categories IS NOT NULL"),
+        ),
+    )
 
     def __repr__(self) -> str:
         return f"<MediaWikiAccountRequest {self.acrid=} {self.discord_message_id=}>"
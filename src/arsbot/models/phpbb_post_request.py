@@ -5,6 +5,22 @@ from .base import BotBase
 
 class PhpbbPostRequest(BotBase):
     __tablename__ = "discord_phpbb_post_requests"
+    __table_args__ = (
+        sa.Index(
+            "ix_discord_phpbb_post_requests_discord_message_id",
+            "discord_message_id",
+            unique=True,
+        ),
+        sa.Index("ix_discord_phpbb_post_requests_post_id", "post_id"),
+        # Requests still waiting on a moderator, used when purging handled requests
+        sa.Index(
+            "ix_discord_phpbb_post_requests_unresolved",
+            "discord_channel_id",
+            "post_id",
+            sqlite_where=sa.text("time_resolved IS NULL"),
+            postgresql_where=sa.text("time_resolved IS NULL"),
+        ),
+    )
 
     def __repr__(self) -> str:
         return f"<PhpbbPostRequest {self.post_id=} {self.is_for_new_topic=} {self.discord_message_id=}>"
@@ -0,0 +1,46 @@
+import sqlalchemy as sa
+
+from .base import BotBase
+
+
+class PhpbbUserProfile(BotBase):
+    __tablename__ = "discord_phpbb_user_profiles"
+
+    def __repr__(self) -> str:
+        return f"<PhpbbUserProfile {self.author_id=} {self.time_fetched=}>"
+
+    id = sa.Column(
+        sa.Integer,
+        primary_key=True,
+    )
+    author_id = sa.Column(
+        sa.Integer,
+        nullable=False,
+        unique=True,
+        doc="The ID of the authors phpbb account.",
+    )
+    user_group_list = sa.Column(
+        sa.String,
+        nullable=False,
+        doc="The list of groups the user belongs to.",
+    )
+    user_join_date = sa.Column(
+        sa.DateTime,
+        nullable=False,
+        doc="When the user joined the board.",
+    )
+    user_post_count = sa.Column(
+        sa.Integer,
+        nullable=False,
+        doc="The amount of posts the user has created.",
+    )
+    user_warning_count = sa.Column(
+        sa.Integer,
+        nullable=False,
+        doc="The amount of warnings the user has received.",
+    )
+    time_fetched = sa.Column(
+        sa.DateTime,
+        nullable=False,
+        doc="When the profile was loaded from the forum.",
+    )
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+
+def atomic_write(path: str, data: bytes) -> None:
+    """
+    Writes data to path through a temporary file in the same directory, so a crash or a
+    concurrent reader never sees a half written file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+        raise
@@ -0,0 +1,21 @@
+import typing as t
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+except ImportError:
+    HTML_PARSER = "html.parser"
+else:
+    HTML_PARSER = "lxml"
+
+
+def parse_html(text: str, parse_only: t.Optional[SoupStrainer] = None) -> BeautifulSoup:
+    """
+    Parses text with lxml when it's installed (the lxml extra), falling back to Python's
+    html.parser.
+
+    When parse_only is given, only elements matching it (and everything inside them) are
+    built into the tree, which skips most of the work on large pages.
+    """
+    return BeautifulSoup(text, features=HTML_PARSER, parse_only=parse_only)
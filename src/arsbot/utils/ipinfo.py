@@ -1,47 +1,259 @@
+from collections import OrderedDict
+from concurrent.futures import Future
 import logging
 import os
+import threading
+import typing as t
 
-import msgpack
+import arrow
 import requests
+from requests.adapters import HTTPAdapter
+import sqlalchemy as sa
 
+from arsbot.core.db import bot_session
+from arsbot.models import IpAddressInfo
 
-IP_DB_FILE = "ip_addresses.bin"
+
+IPINFO_BASE_URL = "https://ipinfo.io"
+IPINFO_TIMEOUT_SECONDS = 10
+IPINFO_POOL_SIZE = 8
+
+# ipinfo.io accepts up to 1000 addresses per batch request, keep requests small.
+IPINFO_BATCH_SIZE = 100
+
+# Lookups are kept in memory in front of the ip_address_info table in the bot database.
+IP_CACHE_SIZE = 1024
+IP_CACHE_TTL_SECONDS = 60 * 60 * 24 * 30
+
+# Failed lookups are only remembered in memory, and only briefly.
+IP_FAILURE_TTL_SECONDS = 60 * 15
 
 log = logging.getLogger("arsbot")
 
+_NOT_CACHED = object()
 
-def _load_ip_db():
-    try:
-        with open(IP_DB_FILE, "rb") as fp:
-            return msgpack.load(fp)
-    except FileNotFoundError:
-        return {}
-    except ValueError:
-        os.remove(IP_DB_FILE)
+# ip address -> (expires at, ipinfo or None if the lookup failed), least recently used first
+_ip_cache = OrderedDict()
+_ip_cache_lock = threading.Lock()
+
+# ip address -> Future for a lookup that's in flight, so each address is only fetched once
+_pending_lookups = {}
+_pending_lookups_lock = threading.Lock()
+
+_ipinfo_session = None
+_ipinfo_session_lock = threading.Lock()
+
+
+def _get_ipinfo_session() -> requests.Session:
+    global _ipinfo_session
+
+    with _ipinfo_session_lock:
+        if _ipinfo_session is None:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=IPINFO_POOL_SIZE)
+
+            _ipinfo_session = requests.Session()
+            _ipinfo_session.mount("https://", adapter)
+            _ipinfo_session.mount("http://", adapter)
+
+        return _ipinfo_session
+
+
+def _get_ipinfo_headers() -> dict:
+    if not (token := os.environ.get("IPINFO_TOKEN")):
         return {}
 
+    return {"Authorization": f"Bearer {token}"}
 
-def _store_ip_db(ip_database: dict):
-    with open(IP_DB_FILE, "wb+") as fp:
-        fp.write(msgpack.dumps(ip_database))
 
-    log.debug(f"Stored {len(ip_database)} entries to {IP_DB_FILE}")
+def _remember_ip(
+    ip_address: str, expires_at: arrow.Arrow, ipinfo: t.Optional[dict]
+) -> None:
+    with _ip_cache_lock:
+        _ip_cache[ip_address] = (expires_at, ipinfo)
+        _ip_cache.move_to_end(ip_address)
 
+        while len(_ip_cache) > IP_CACHE_SIZE:
+            _ip_cache.popitem(last=False)
+
+
+def _get_cached_ip(ip_address: str):
+    with _ip_cache_lock:
+        if cached := _ip_cache.get(ip_address):
+            _ip_cache.move_to_end(ip_address)
+
+    if cached:
+        expires_at, ipinfo = cached
+        if arrow.utcnow() < expires_at:
+            return ipinfo
+
+    with bot_session() as session:
+        stored = (
+            session.query(IpAddressInfo).filter_by(ip_address=ip_address).one_or_none()
+        )
+
+        if not stored:
+            return _NOT_CACHED
+
+        expires_at = arrow.get(stored.time_fetched).shift(seconds=IP_CACHE_TTL_SECONDS)
+        if arrow.utcnow() >= expires_at:
+            return _NOT_CACHED
+
+        _remember_ip(ip_address, expires_at, stored.info)
+
+        return stored.info
+
+
+def _store_ip(ip_address: str, ipinfo: dict) -> None:
+    time_fetched = arrow.utcnow()
+
+    with bot_session() as session:
+        stored = (
+            session.query(IpAddressInfo).filter_by(ip_address=ip_address).one_or_none()
+        ) or IpAddressInfo(ip_address=ip_address)
+
+        stored.info = ipinfo
+        stored.time_fetched = time_fetched.datetime
+
+        session.add(stored)
+
+        try:
+            session.commit()
+        except sa.exc.IntegrityError:
+            # Another worker stored the same address first
+            session.rollback()
+
+    _remember_ip(ip_address, time_fetched.shift(seconds=IP_CACHE_TTL_SECONDS), ipinfo)
+
+
+def clear_ip_cache() -> None:
+    """
+    Empties the in-memory cache, including failed lookups. Stored lookups are still
+    used until they expire.
+    """
+    with _ip_cache_lock:
+        _ip_cache.clear()
 
-def get_ip_address_info(post_ip_address: str):
-    ip_database = _load_ip_db()
-    if post_ip_address in ip_database:
-        return ip_database[post_ip_address]
 
-    ipinfo_response = requests.get(f"https://ipinfo.io/{post_ip_address}")
+def _fetch_ip(ip_address: str) -> t.Optional[dict]:
+    try:
+        ipinfo_response = _get_ipinfo_session().get(
+            f"{IPINFO_BASE_URL}/{ip_address}",
+            headers=_get_ipinfo_headers(),
+            timeout=IPINFO_TIMEOUT_SECONDS,
+        )
+    except requests.RequestException as exc:
+        log.error(f"Unable to look up {ip_address}: {exc!r}")
+        return None
+
     if not ipinfo_response.ok:
         log.error(ipinfo_response.content)
         return None
 
-    ipinfo = ipinfo_response.json()
+    return ipinfo_response.json()
+
+
+def _fetch_ip_batch(ip_addresses: t.List[str]) -> t.Dict[str, dict]:
+    try:
+        ipinfo_response = _get_ipinfo_session().post(
+            f"{IPINFO_BASE_URL}/batch",
+            json=ip_addresses,
+            headers=_get_ipinfo_headers(),
+            timeout=IPINFO_TIMEOUT_SECONDS,
+        )
+    except requests.RequestException as exc:
+        log.error(f"Unable to look up {len(ip_addresses)} addresses: {exc!r}")
+        return {}
+
+    if not ipinfo_response.ok:
+        log.error(ipinfo_response.content)
+        return {}
+
+    return {
+        ip_address: ipinfo
+        for ip_address, ipinfo in ipinfo_response.json().items()
+        if isinstance(ipinfo, dict) and "error" not in ipinfo
+    }
+
+
+def _claim_lookups(
+    ip_addresses: t.List[str],
+) -> t.Tuple[t.List[str], t.Dict[str, Future]]:
+    """
+    Splits ip_addresses into those this caller has to fetch and those already being
+    fetched by another thread.
+    """
+    claimed = []
+    in_flight = {}
+
+    with _pending_lookups_lock:
+        for ip_address in ip_addresses:
+            if pending_lookup := _pending_lookups.get(ip_address):
+                in_flight[ip_address] = pending_lookup
+                continue
+
+            _pending_lookups[ip_address] = Future()
+            claimed.append(ip_address)
 
-    ip_database[post_ip_address] = ipinfo
+    return claimed, in_flight
 
-    _store_ip_db(ip_database)
 
-    return ipinfo
+def _finish_lookup(ip_address: str, ipinfo: t.Optional[dict]) -> None:
+    try:
+        if ipinfo:
+            _store_ip(ip_address, ipinfo)
+        else:
+            expires_at = arrow.utcnow().shift(seconds=IP_FAILURE_TTL_SECONDS)
+            _remember_ip(ip_address, expires_at, None)
+    except Exception:
+        # Threads waiting on this lookup still get the result
+        log.exception(f"Unable to cache lookup for {ip_address}")
+
+    with _pending_lookups_lock:
+        pending_lookup = _pending_lookups.pop(ip_address)
+
+    pending_lookup.set_result(ipinfo)
+
+
+def get_ip_addresses_info(
+    ip_addresses: t.Iterable[str],
+) -> t.Dict[str, t.Optional[dict]]:
+    """
+    Looks up every address in ip_addresses, returning None for addresses that failed.
+
+    When IPINFO_TOKEN is set, addresses that aren't cached are fetched with ipinfo.io's
+    batch endpoint instead of one request each.
+    """
+    results = {}
+    uncached = []
+
+    for ip_address in dict.fromkeys(ip_addresses):
+        if (ipinfo := _get_cached_ip(ip_address)) is _NOT_CACHED:
+            uncached.append(ip_address)
+        else:
+            results[ip_address] = ipinfo
+
+    claimed, in_flight = _claim_lookups(uncached)
+
+    try:
+        if len(claimed) > 1 and os.environ.get("IPINFO_TOKEN"):
+            for index in range(0, len(claimed), IPINFO_BATCH_SIZE):
+                batch = claimed[index : index + IPINFO_BATCH_SIZE]
+                fetched = _fetch_ip_batch(batch)
+
+                for ip_address in batch:
+                    results[ip_address] = fetched.get(ip_address)
+        else:
+            for ip_address in claimed:
+                results[ip_address] = _fetch_ip(ip_address)
+    finally:
+        for ip_address in claimed:
+            _finish_lookup(ip_address, results.get(ip_address))
+
+    for ip_address, pending_lookup in in_flight.items():
+        results[ip_address] = pending_lookup.result()
+
+    return results
+
+
+def get_ip_address_info(post_ip_address: str):
+    return get_ip_addresses_info([post_ip_address])[post_ip_address]
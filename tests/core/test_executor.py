@@ -0,0 +1,34 @@
+import threading
+
+import pytest
+
+from arsbot.core.executor import run_in_background, run_interactive
+
+
+def _blocking_call(value, *, suffix):
+    return f"{value}{suffix}", threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_run_in_background():
+    result, thread_name = await run_in_background(_blocking_call, "sync", suffix="!")
+
+    assert result == "sync!"
+    assert thread_name.startswith("arsbot-background")
+
+
+@pytest.mark.asyncio
+async def test_run_interactive():
+    result, thread_name = await run_interactive(_blocking_call, "approve", suffix="?")
+
+    assert result == "approve?"
+    assert thread_name.startswith("arsbot-interactive")
+
+
+@pytest.mark.asyncio
+async def test_run_interactive_raises():
+    def _fail():
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        await run_interactive(_fail)
@@ -0,0 +1,95 @@
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import pytest
+import pytest_asyncio
+
+from arsbot.core import http
+
+
+async def _index(request):
+    return web.Response(text=f"{request.host} {request.path} {request.query_string}")
+
+
+async def _login(request):
+    response = web.Response(text="logged in")
+    response.set_cookie("sid", "sid1")
+    response.set_cookie("user", "1")
+    return response
+
+
+async def _whoami(request):
+    return web.Response(text=request.cookies.get("sid", "anonymous"))
+
+
+async def _logout(request):
+    response = web.Response(text="logged out")
+    response.del_cookie("sid")
+    return response
+
+
+@pytest_asyncio.fixture
+async def stub_server():
+    app = web.Application()
+    app.router.add_get("/forums/", _index)
+    app.router.add_get("/forums/login", _login)
+    app.router.add_get("/forums/whoami", _whoami)
+    app.router.add_get("/forums/logout", _logout)
+
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+
+    yield server
+
+    await server.close()
+    await http.close_client_session()
+
+
+@pytest.mark.asyncio
+async def test_async_session_uses_base_url(stub_server):
+    session = http.AsyncSession(f"http://127.0.0.1:{stub_server.port}/forums")
+
+    response = await session.get("/", params={"t": 1})
+
+    assert response.ok
+    assert response.status_code == 200
+    assert response.text == f"127.0.0.1:{stub_server.port} /forums/ t=1"
+
+
+@pytest.mark.asyncio
+async def test_async_session_tracks_cookies(stub_server):
+    session = http.AsyncSession(f"http://127.0.0.1:{stub_server.port}/forums")
+    other_session = http.AsyncSession(f"http://127.0.0.1:{stub_server.port}/forums")
+
+    await session.get("/login")
+    assert session.cookies == {"sid": "sid1", "user": "1"}
+
+    response = await session.get("/whoami")
+    assert response.text == "sid1"
+
+    # Cookies belong to the session, not the shared connection pool
+    response = await other_session.get("/whoami")
+    assert response.text == "anonymous"
+
+    await session.get("/logout")
+    assert session.cookies == {"user": "1"}
+
+
+@pytest.mark.asyncio
+async def test_async_session_forced_ip(stub_server):
+    session = http.AsyncSession(
+        f"http://forums.arsbot.invalid:{stub_server.port}/forums",
+        forced_ip="127.0.0.1",
+    )
+
+    response = await session.get("/")
+
+    assert response.text == f"forums.arsbot.invalid:{stub_server.port} /forums/ "
+
+
+@pytest.mark.asyncio
+async def test_get_client_session_is_shared(stub_server):
+    assert http.get_client_session() is http.get_client_session()
+
+    await http.close_client_session()
+
+    assert not http.get_client_session().closed
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from arsbot.core.scheduler import Scheduler
+
+
+class Recorder:
+    def __init__(self, name: str, interval: float, runs: list):
+        self._name = name
+        self._interval = interval
+        self._runs = runs
+
+    async def __call__(self, now: float) -> float:
+        self._runs.append(self._name)
+        await asyncio.sleep(0)
+        return now + self._interval
+
+
+@pytest.mark.asyncio
+async def test_run_pending_runs_due_jobs_in_deadline_order():
+    runs = []
+    scheduler = Scheduler()
+
+    scheduler.add_job("slow", Recorder("slow", 60, runs), interval=60, run_at=2)
+    scheduler.add_job("fast", Recorder("fast", 10, runs), interval=10, run_at=1)
+    scheduler.add_job("later", Recorder("later", 10, runs), interval=10, run_at=10**12)
+
+    await scheduler.run_pending(100)
+    assert runs == ["fast", "slow"]
+
+    # Both jobs were pushed back relative to when they actually ran
+    assert scheduler.next_run_at() > 100
+
+
+@pytest.mark.asyncio
+async def test_failing_job_runs_again_after_its_interval():
+    runs = []
+    scheduler = Scheduler()
+
+    async def _failing_job(now: float) -> float:
+        runs.append("failing")
+        raise TimeoutError("wiki timed out")
+
+    scheduler.add_job("failing", _failing_job, interval=30, run_at=1)
+    scheduler.add_job("other", Recorder("other", 10, runs), interval=10, run_at=2)
+
+    await scheduler.run_pending(100)
+
+    # The failure didn't stop the other job, and the failing job was pushed back
+    assert runs == ["failing", "other"]
+    assert scheduler.next_run_at() > 100
+
+
+def test_add_job_twice_fails():
+    scheduler = Scheduler()
+    scheduler.add_job("a", Recorder("a", 10, []), interval=10)
+
+    with pytest.raises(ValueError):
+        scheduler.add_job("a", Recorder("a", 10, []), interval=10)
+
+
+@pytest.mark.asyncio
+async def test_run_forever_sleeps_until_next_deadline():
+    runs = []
+    scheduler = Scheduler()
+
+    scheduler.add_job("tick", Recorder("tick", 0.05, runs), interval=0.05)
+
+    task = asyncio.create_task(scheduler.run_forever())
+    await asyncio.sleep(0.12)
+    task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Runs immediately, then once per interval rather than on every loop iteration
+    assert 2 <= len(runs) <= 4
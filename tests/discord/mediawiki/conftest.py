@@ -0,0 +1,15 @@
+import pytest
+
+from arsbot.discord.mediawiki import api_client
+
+
+@pytest.fixture(autouse=True, scope="function")
+def mw_session_file(bot_data_dir, monkeypatch):
+    mw_session_file = bot_data_dir / "mw_session.data"
+    monkeypatch.setattr(api_client, "MW_SESSION_FILE", str(mw_session_file))
+
+    api_client.mw_session_manager.reset()
+
+    yield mw_session_file
+
+    api_client.mw_session_manager.reset()
@@ -0,0 +1,427 @@
+import re
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import arrow
+import pytest
+import pytest_asyncio
+import responses
+
+from arsbot.core import http
+from arsbot.discord.mediawiki import api_client
+from arsbot.models import MediaWikiAccountRequest
+
+from tests.conftest import read_test_file
+
+
+WIKI_URL = "https://wiki.airraidsirens.net"
+
+
+def _add_login_responses():
+    responses.add(
+        responses.GET,
+        url=f"{WIKI_URL}/index.php",
+        match=[responses.matchers.query_param_matcher({"title": "Special:UserLogin"})],
+        body=read_test_file("wiki_login_form.html"),
+    )
+    return responses.add(
+        responses.POST,
+        url=re.compile(r"https://wiki\.airraidsirens\.net/Special:UserLogin\?.*$"),
+        body=read_test_file("wiki_login_success.html"),
+        headers={"Set-Cookie": "wiki_session=abc; Path=/"},
+    )
+
+
+LOGGED_IN_PAGE = '<html><body><li id="pt-logout">Log out</li></body></html>'
+
+
+def _add_confirm_account_responses(
+    acrid: int, body: str = LOGGED_IN_PAGE, status: int = 200
+):
+    responses.add(
+        responses.GET,
+        url=f"{WIKI_URL}/index.php",
+        match=[
+            responses.matchers.query_param_matcher(
+                {"title": "Special:ConfirmAccounts/authors", "acrid": acrid}
+            )
+        ],
+        body=body,
+        status=status,
+    )
+
+
+def _make_request(acrid: int) -> MediaWikiAccountRequest:
+    return MediaWikiAccountRequest(
+        acrid=acrid,
+        username=f"user{acrid}",
+        biography="biography_value",
+        email="email_value",
+    )
+
+
+@responses.activate
+def test_process_account_requests_reuses_session(mw_session_file):
+    login = _add_login_responses()
+    home_page = responses.add(responses.GET, url=f"{WIKI_URL}/")
+    for acrid in (1, 2, 3):
+        _add_confirm_account_responses(acrid)
+    responses.add(responses.POST, url=f"{WIKI_URL}/Special:ConfirmAccounts/authors")
+
+    results = api_client.process_account_requests(
+        [_make_request(acrid) for acrid in (1, 2, 3)],
+        approved=False,
+        reviewer_name="pytest",
+    )
+    assert results == {1: True, 2: True, 3: True}
+
+    assert api_client.process_account_request(
+        request=_make_request(1), approved=False, reviewer_name="pytest"
+    )
+
+    assert login.call_count == 1
+    assert home_page.call_count == 0
+    assert mw_session_file.exists()
+
+
+@responses.activate
+def test_process_account_request_logs_in_again_when_session_expired(mw_session_file):
+    login = _add_login_responses()
+    _add_confirm_account_responses(1, body=api_client.INVALID_SESSION_TEXT)
+    _add_confirm_account_responses(1)
+    responses.add(responses.POST, url=f"{WIKI_URL}/Special:ConfirmAccounts/authors")
+
+    assert api_client.process_account_request(
+        request=_make_request(1), approved=False, reviewer_name="pytest"
+    )
+
+    assert login.call_count == 2
+
+
+PERMISSION_ERROR_PAGE = (
+    "<html><body><h1>Permission error</h1>"
+    "<p>You do not have permission to do that.</p>"
+    '<a href="/index.php?title=Special:UserLogin">Log in</a></body></html>'
+)
+
+
+@responses.activate
+def test_process_account_request_logs_in_again_on_permission_error(mw_session_file):
+    login = _add_login_responses()
+    _add_confirm_account_responses(1, body=PERMISSION_ERROR_PAGE, status=403)
+    _add_confirm_account_responses(1)
+    moderate = responses.add(
+        responses.POST, url=f"{WIKI_URL}/Special:ConfirmAccounts/authors"
+    )
+
+    assert api_client.process_account_request(
+        request=_make_request(1), approved=False, reviewer_name="pytest"
+    )
+
+    # The session was dropped and logged in again rather than posting without a token
+    assert login.call_count == 2
+    assert moderate.call_count == 1
+
+
+@pytest_asyncio.fixture
+async def permission_error_server():
+    requests = []
+
+    async def _index(request):
+        requests.append(request.query.get("title"))
+        return web.Response(
+            status=403, text=PERMISSION_ERROR_PAGE, content_type="text/html"
+        )
+
+    app = web.Application()
+    app.router.add_get("/index.php", _index)
+
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+
+    yield server, requests
+
+    await server.close()
+    await http.close_client_session()
+
+
+@pytest.mark.asyncio
+async def test_get_accounts_permission_error_is_expired_session(
+    monkeypatch, permission_error_server
+):
+    server, requests = permission_error_server
+    invalidated = []
+
+    def _get_session():
+        return api_client.MWSession(base_url=str(server.make_url("")).rstrip("/"))
+
+    monkeypatch.setattr(api_client.mw_session_manager, "get_session", _get_session)
+    monkeypatch.setattr(api_client.mw_session_manager, "invalidate", invalidated.append)
+
+    with pytest.raises(api_client.MWSessionExpired):
+        async for href, account in api_client.AccountRequestWalk():
+            pass
+
+    # Logged in again once before giving up, rather than reporting an empty list
+    assert requests == ["Special:ConfirmAccounts/authors"] * 2
+    assert len(invalidated) == 1
+
+
+def test_open_session_does_not_keep_failed_login(monkeypatch, mw_session_file):
+    def _failed_login(session):
+        raise api_client.PhpBBLoginFailed(None)
+
+    monkeypatch.setenv("WIKI_BASE_URL", WIKI_URL)
+    monkeypatch.setattr(api_client, "_login_to_mediawiki", _failed_login)
+
+    with pytest.raises(api_client.PhpBBLoginFailed):
+        api_client.mw_session_manager.get_session()
+
+    assert api_client.mw_session_manager._session is None
+    assert not mw_session_file.exists()
+
+
+def _make_accounts_page(acrids: list, next_href: str = None) -> str:
+    links = "".join(
+        f"<li>(2024-01-02T03:04:05) "
+        f'<a href="/index.php?title=Special:ConfirmAccounts/authors&amp;acrid={acrid}">'
+        "Review</a></li>"
+        for acrid in acrids
+    )
+    tables = "".join(
+        f'<table class="mw-confirmaccount-body-0"><tr><td>Username</td>'
+        f"<td>user{acrid}</td></tr></table>"
+        for acrid in acrids
+    )
+    next_link = f'<a rel="next" href="{next_href}">next</a>' if next_href else ""
+
+    return f"<html><body><ul>{links}</ul>{tables}{next_link}</body></html>"
+
+
+def test_parse_accounts_page():
+    accounts, next_href = api_client._parse_accounts_page(
+        _make_accounts_page([5, 4], next_href="/page2")
+    )
+
+    assert next_href == "/page2"
+    assert [account["acrid"] for account in accounts.values()] == [5, 4]
+    assert [account["Username"] for account in accounts.values()] == ["user5", "user4"]
+
+
+class AccountPages:
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.loaded = []
+
+    async def __call__(self, url: str):
+        self.loaded.append(url)
+        acrids, next_href = self.pages[url]
+        return api_client._parse_accounts_page(_make_accounts_page(acrids, next_href))
+
+
+SORTED_PAGES = {
+    api_client.ACCOUNT_REQUESTS_URL: ([8, 7], "/2"),
+    "/2": ([6, 5], "/3"),
+    "/3": ([4], None),
+}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "stop_at_acrid, pages, expected_acrids, stopped_early, lowest_acrid",
+    [
+        # Full walk
+        (None, SORTED_PAGES, [8, 7, 6, 5, 4], False, 4),
+        # Reaches a known acrid on the first page
+        (9, SORTED_PAGES, [8, 7], True, 7),
+        # Reaches a known acrid on the second page
+        (5, SORTED_PAGES, [8, 7, 6, 5], True, 5),
+        # Pages that aren't sorted newest first are read past
+        (
+            9,
+            {**SORTED_PAGES, api_client.ACCOUNT_REQUESTS_URL: ([7, 8], "/2")},
+            [7, 8, 6, 5],
+            True,
+            5,
+        ),
+    ],
+)
+async def test_account_request_walk(
+    monkeypatch, stop_at_acrid, pages, expected_acrids, stopped_early, lowest_acrid
+):
+    pages = AccountPages(pages)
+    monkeypatch.setattr(api_client, "_get_accounts", pages)
+
+    walk = api_client.AccountRequestWalk(stop_at_acrid=stop_at_acrid)
+    acrids = [account["acrid"] async for href, account in walk]
+
+    assert acrids == expected_acrids
+    assert walk.stopped_early is stopped_early
+    assert walk.lowest_acrid == lowest_acrid
+
+    # Nothing past the last page read is loaded
+    assert pages.loaded == [
+        url
+        for url, (page_acrids, next_href) in pages.pages.items()
+        if set(page_acrids) & set(expected_acrids)
+    ]
+
+
+def _make_api_response(acrids: list, continue_token: str = None) -> dict:
+    data = {
+        "batchcomplete": True,
+        "query": {
+            "accountrequests": [
+                {
+                    "acrid": acrid,
+                    "name": f"user{acrid}",
+                    "real_name": f"User {acrid}",
+                    "email": f"user{acrid}@example.com",
+                    "bio": "biography_value",
+                    "registration": "2024-01-02T03:04:05Z",
+                }
+                for acrid in acrids
+            ]
+        },
+    }
+
+    if continue_token:
+        data["continue"] = {"acrcontinue": continue_token, "continue": "-||"}
+
+    return data
+
+
+def test_parse_api_accounts():
+    accounts, next_params = api_client._parse_api_accounts(
+        _make_api_response([5, 4], continue_token="3"), "accountrequests"
+    )
+
+    assert next_params == {"acrcontinue": "3", "continue": "-||"}
+    assert accounts["/index.php?title=Special:ConfirmAccounts/authors&acrid=5"] == {
+        "Username": "user5",
+        "Name": "User 5",
+        "Email": "user5@example.com",
+        "Biography": "biography_value",
+        "RequestedTimestamp": arrow.get("2024-01-02T03:04:05Z"),
+        "acrid": 5,
+    }
+    assert [account["acrid"] for account in accounts.values()] == [5, 4]
+
+
+def test_parse_api_accounts_error():
+    with pytest.raises(api_client.AccountRequestsApiError):
+        api_client._parse_api_accounts(
+            {"error": {"code": "badvalue", "info": "Unrecognized value"}},
+            "accountrequests",
+        )
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        # Missing field
+        {"acrid": 5, "name": "user5"},
+        # Bad acrid
+        {"acrid": "five", "name": "user5"},
+        # Bad timestamp
+        {
+            "acrid": 5,
+            "name": "user5",
+            "real_name": "User 5",
+            "email": "user5@example.com",
+            "bio": "biography_value",
+            "registration": "yesterday",
+        },
+        # Not an object
+        "user5",
+    ],
+)
+def test_parse_api_accounts_malformed_entry(entry):
+    with pytest.raises(api_client.AccountRequestsApiError):
+        api_client._parse_api_accounts(
+            {"query": {"accountrequests": [entry]}}, "accountrequests"
+        )
+
+
+class ApiAccountPages:
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.loaded = []
+
+    async def __call__(self, continue_params: dict):
+        token = continue_params.get("acrcontinue")
+        self.loaded.append(token)
+        acrids, next_token = self.pages[token]
+        if acrids is None:
+            raise api_client.AccountRequestsApiError("badcontinue: Invalid continue")
+
+        return api_client._parse_api_accounts(
+            _make_api_response(acrids, next_token), "accountrequests"
+        )
+
+
+@pytest.mark.asyncio
+async def test_account_request_walk_uses_api(monkeypatch):
+    monkeypatch.setenv("WIKI_ACCOUNT_REQUESTS_API_LIST", "accountrequests")
+    monkeypatch.setattr(api_client, "_account_requests_api_retry_at", None)
+
+    api_pages = ApiAccountPages({None: ([8, 7], "6"), "6": ([6, 5], None)})
+    html_pages = AccountPages(SORTED_PAGES)
+    monkeypatch.setattr(api_client, "_get_api_accounts", api_pages)
+    monkeypatch.setattr(api_client, "_get_accounts", html_pages)
+
+    walk = api_client.AccountRequestWalk(stop_at_acrid=6)
+    acrids = [account["acrid"] async for href, account in walk]
+
+    assert acrids == [8, 7, 6, 5]
+    assert walk.stopped_early is False
+    assert walk.lowest_acrid == 5
+    assert api_pages.loaded == [None, "6"]
+    assert html_pages.loaded == []
+
+
+@pytest.mark.asyncio
+async def test_account_request_walk_falls_back_to_html(monkeypatch):
+    monkeypatch.setenv("WIKI_ACCOUNT_REQUESTS_API_LIST", "accountrequests")
+    monkeypatch.setattr(api_client, "_account_requests_api_retry_at", None)
+
+    api_calls = []
+
+    async def _failing_api(continue_params: dict):
+        api_calls.append(continue_params)
+        raise api_client.AccountRequestsApiError("badvalue: Unrecognized value")
+
+    monkeypatch.setattr(api_client, "_get_api_accounts", _failing_api)
+    monkeypatch.setattr(api_client, "_get_accounts", AccountPages(SORTED_PAGES))
+
+    accounts = await api_client.get_pending_accounts()
+    assert [account["acrid"] for account in accounts.values()] == [8, 7, 6, 5, 4]
+
+    # The API isn't asked again until the retry period is over
+    await api_client.get_pending_accounts()
+    assert len(api_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_account_request_walk_api_error_on_later_batch(monkeypatch):
+    monkeypatch.setenv("WIKI_ACCOUNT_REQUESTS_API_LIST", "accountrequests")
+    monkeypatch.setattr(api_client, "_account_requests_api_retry_at", None)
+
+    api_pages = ApiAccountPages({None: ([8, 7], "6"), "6": (None, None)})
+    html_pages = AccountPages(SORTED_PAGES)
+    monkeypatch.setattr(api_client, "_get_api_accounts", api_pages)
+    monkeypatch.setattr(api_client, "_get_accounts", html_pages)
+
+    acrids = []
+    with pytest.raises(api_client.AccountRequestsApiError):
+        async for href, account in api_client.AccountRequestWalk():
+            acrids.append(account["acrid"])
+
+    # The walk fails instead of passing off a partial list as complete
+    assert acrids == [8, 7]
+    assert html_pages.loaded == []
+
+    # The next walk scrapes the HTML pages
+    accounts = await api_client.get_pending_accounts()
+    assert [account["acrid"] for account in accounts.values()] == [8, 7, 6, 5, 4]
+    assert api_pages.loaded == [None, "6"]
@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+
+import discord
+import pytest
+import sqlalchemy as sa
+
+from arsbot.core.db import bot_session, get_engine
+from arsbot.discord.mediawiki.channels import (
+    get_requests_from_channel,
+    purge_handled_requests,
+)
+from arsbot.models import MediaWikiAccountRequest
+
+
+class Message:
+    def __init__(self, message_id: int):
+        self.id = message_id
+        self.deleted = False
+
+    async def delete(self) -> None:
+        self.deleted = True
+
+
+class Channel:
+    def __init__(self, messages: list):
+        self.id = 3
+        self._messages = messages
+        self.bulk_deletes = []
+
+    async def history(self):
+        for message in self._messages:
+            yield message
+
+    def get_partial_message(self, message_id: int) -> Message:
+        return Message(message_id)
+
+    async def delete_messages(self, messages) -> None:
+        self.bulk_deletes.append([message.id for message in messages])
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs) -> None:
+        self.count += 1
+
+
+def _add_request(session, acrid: int, discord_message_id: int) -> None:
+    session.add(
+        MediaWikiAccountRequest(
+            acrid=acrid,
+            discord_message_id=discord_message_id,
+            discord_channel_id=3,
+            discord_guild_id=1,
+            request_url="https://invalid",
+            time_created=datetime.now(),
+        )
+    )
+
+
+@pytest.mark.asyncio
+async def test_get_requests_from_channel_queries_once_per_page():
+    with bot_session() as session:
+        for acrid in range(1, 151):
+            _add_request(session, acrid=acrid, discord_message_id=1000 + acrid)
+        session.commit()
+
+    # 150 tracked messages plus one that isn't in the database
+    messages = [Message(1000 + acrid) for acrid in range(1, 151)] + [Message(9999)]
+    query_counter = QueryCounter()
+
+    sa.event.listen(get_engine(), "before_cursor_execute", query_counter)
+    try:
+        known_request_ids = await get_requests_from_channel(Channel(messages))
+    finally:
+        sa.event.remove(get_engine(), "before_cursor_execute", query_counter)
+
+    assert known_request_ids == {acrid: 1000 + acrid for acrid in range(1, 151)}
+    assert [message.id for message in messages if message.deleted] == [9999]
+
+    # One query per page of history rather than one per message
+    assert query_counter.count == 2
+
+
+@pytest.mark.asyncio
+async def test_purge_handled_requests_bulk_deletes_messages():
+    first_message_id = discord.utils.time_snowflake(datetime.now(timezone.utc))
+
+    with bot_session() as session:
+        for acrid in range(1, 6):
+            _add_request(
+                session, acrid=acrid, discord_message_id=first_message_id + acrid
+            )
+        session.commit()
+
+    channel = Channel([])
+
+    # 1 and 2 are still pending on the wiki, the rest were handled there
+    await purge_handled_requests({1, 2}, channel)
+
+    assert channel.bulk_deletes == [[first_message_id + acrid for acrid in range(3, 6)]]
+
+    with bot_session() as session:
+        remaining = session.query(MediaWikiAccountRequest.acrid).all()
+
+    assert sorted(acrid for (acrid,) in remaining) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_purge_handled_requests_min_acrid():
+    first_message_id = discord.utils.time_snowflake(datetime.now(timezone.utc))
+
+    with bot_session() as session:
+        for acrid in range(1, 6):
+            _add_request(
+                session, acrid=acrid, discord_message_id=first_message_id + acrid
+            )
+        session.commit()
+
+    channel = Channel([])
+
+    # Only acrids 4 and up were listed, so 1 to 3 are left alone
+    await purge_handled_requests({5}, channel, min_acrid=4)
+
+    with bot_session() as session:
+        remaining = session.query(MediaWikiAccountRequest.acrid).all()
+
+    assert sorted(acrid for (acrid,) in remaining) == [1, 2, 3, 5]
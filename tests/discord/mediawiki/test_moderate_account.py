@@ -34,6 +34,10 @@ class DiscordMessage:
         self._text = text
         self._deleted = False
 
+    @property
+    def id(self) -> int:
+        return self._message_id
+
     async def delete(self) -> None:
         await asyncio.sleep(0)
 
@@ -66,6 +70,10 @@ class DiscordInteraction:
     def response(self) -> DiscordResponse:
         return self._response
 
+    @property
+    def channel_id(self) -> int:
+        return self._message._channel_id
+
     @property
     def message(self):
         return self._message
@@ -95,6 +103,9 @@ class DiscordClient:
             "2": DiscordChannel("2"),
         }
 
+    def get_channel(self, channel_id: int):
+        return None
+
     async def fetch_channel(self, channel_id):
         await asyncio.sleep(0)
         return self._channels.get(channel_id)
@@ -7,8 +7,15 @@ import logging
 import pytest
 
 from arsbot.core.db import bot_session
-from arsbot.discord.mediawiki.task import handle_automod_requests
-from arsbot.discord.utils import task_state
+from arsbot.discord.mediawiki.api_client import (
+    AccountRequestsApiError,
+    MWSessionExpired,
+)
+from arsbot.discord.mediawiki.task import (
+    _sync_mediawiki_requests,
+    handle_automod_requests,
+)
+from arsbot.discord.utils import task_state, wiki_log_digest
 from arsbot.models import MediaWikiAccountRequest
 
 
@@ -46,20 +53,23 @@ class Writer:
         return self._records
 
 
-class _process_account_request:
+class _process_account_requests:
     def __call__(
-        self, request: MediaWikiAccountRequest, approved: int, reviewer_name: str
-    ) -> bool:
-        return True
+        self,
+        account_requests: list[MediaWikiAccountRequest],
+        approved: int,
+        reviewer_name: str,
+    ) -> dict:
+        return {request.acrid: True for request in account_requests}
 
 
 TASK_PATH = "arsbot.discord.mediawiki.task"
 
 
 @pytest.fixture(autouse=True)
-def _patched_process_account_request():
+def _patched_process_account_requests():
     with patch(
-        TASK_PATH + ".process_account_request", new_callable=_process_account_request
+        TASK_PATH + ".process_account_requests", new_callable=_process_account_requests
     ) as patched:
         yield patched
 
@@ -72,7 +82,7 @@ def _patched_send_to_debug():
 
 @pytest.fixture(autouse=True)
 def _patched_send_to_wiki_log():
-    with patch(TASK_PATH + ".send_to_wiki_log", new_callable=Writer) as patched:
+    with patch.object(wiki_log_digest, "send", new_callable=Writer) as patched:
         yield patched
 
 
@@ -124,3 +134,107 @@ async def test_handle_automod_requests(caplog, _patched_send_to_wiki_log):
         == "Wiki account for username_value denied by arsbot"
     )
     _patched_send_to_wiki_log.clear()
+
+
+class _failing_process_account_requests:
+    def __call__(
+        self,
+        account_requests: list[MediaWikiAccountRequest],
+        approved: int,
+        reviewer_name: str,
+    ) -> dict:
+        return {request.acrid: request.acrid != 12 for request in account_requests}
+
+
+@pytest.mark.asyncio
+async def test_handle_automod_requests_batch(_patched_send_to_debug):
+    three_days_ago = datetime.now(timezone.utc) - timedelta(days=3)
+
+    with bot_session() as session:
+        for acrid in range(10, 14):
+            session.add(
+                MediaWikiAccountRequest(
+                    acrid=acrid,
+                    username=f"spammer{acrid}",
+                    name="name_value",
+                    email="email_value",
+                    biography="biography_value",
+                    discord_message_id=100 + acrid,
+                    discord_channel_id=4,
+                    discord_guild_id=5,
+                    request_url="request_url_value",
+                    automod_spam_categories="HAS_HTML",
+                    time_created=three_days_ago,
+                )
+            )
+        session.commit()
+
+    summaries = []
+
+    async def _send_summary(events):
+        summaries.append([event.message for event in events])
+
+    with (
+        patch(
+            TASK_PATH + ".process_account_requests",
+            new_callable=_failing_process_account_requests,
+        ),
+        patch.object(wiki_log_digest, "send_summary", _send_summary),
+    ):
+        await handle_automod_requests()
+
+    assert summaries == [
+        [
+            "Wiki account for spammer10 denied by arsbot",
+            "Wiki account for spammer11 denied by arsbot",
+            "Wiki account for spammer13 denied by arsbot",
+        ]
+    ]
+    assert _patched_send_to_debug.records == [
+        "Failed to process 1 of 4 mediawiki account confirmations"
+    ]
+
+    with bot_session() as session:
+        unresolved = (
+            session.query(MediaWikiAccountRequest.acrid)
+            .filter(MediaWikiAccountRequest.time_resolved.is_(None))
+            .all()
+        )
+
+    assert [row.acrid for row in unresolved] == [12]
+
+
+class _FailingAccountRequestWalk:
+    error = None
+
+    def __init__(self, stop_at_acrid=None):
+        self.stopped_early = False
+
+    async def __aiter__(self):
+        raise self.error
+        yield
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "error",
+    [MWSessionExpired(), AccountRequestsApiError("badcontinue: Invalid continue")],
+)
+async def test_sync_mediawiki_requests_skips_purge_when_walk_fails(error):
+    purged = []
+
+    async def _known_request_ids(now):
+        return {1, 2}
+
+    async def _purge_handled_requests(*args, **kwargs):
+        purged.append(args)
+
+    with (
+        patch(TASK_PATH + "._get_known_request_ids", _known_request_ids),
+        patch(TASK_PATH + ".AccountRequestWalk", _FailingAccountRequestWalk),
+        patch.object(_FailingAccountRequestWalk, "error", error),
+        patch(TASK_PATH + ".purge_handled_requests", _purge_handled_requests),
+    ):
+        await _sync_mediawiki_requests(now=0)
+
+    assert purged == []
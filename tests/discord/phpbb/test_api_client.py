@@ -1,9 +1,16 @@
 from functools import partial
-from urllib.parse import parse_qs
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+import asyncio
 
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import arrow
 import pytest
+import pytest_asyncio
 import responses
 
+from arsbot.core import http
 from arsbot.discord.phpbb import api_client
 
 from tests.conftest import read_test_file
@@ -60,10 +67,12 @@ def patch_api_client(bot_data_dir):
 
     phpbb_session_file = bot_data_dir / "phpbb_session.data"
     api_client.PHPBB_SESSION_FILE = str(phpbb_session_file)
+    api_client._adm_session = None
 
     yield
 
     api_client.PHPBB_SESSION_FILE = old_session_file
+    api_client._adm_session = None
 
 
 @responses.activate
@@ -168,7 +177,407 @@ def test_login_to_phpbb_succeeds(bot_env_config):
     assert session.user_id == 1
 
 
+@responses.activate
+def test_session_saves_cookies_only_when_changed(monkeypatch):
+    writes = []
+    atomic_write = api_client.atomic_write
+
+    def _counting_atomic_write(path, data):
+        writes.append(data)
+        atomic_write(path, data)
+
+    monkeypatch.setattr(api_client, "atomic_write", _counting_atomic_write)
+
+    responses.add_callback(
+        responses.GET,
+        url="https://airraidsirens.net/forums/",
+        callback=_get_index_callback,
+    )
+    responses.add(responses.GET, url="https://airraidsirens.net/forums/index.php")
+
+    session = api_client.PhpBBSession(base_url="https://airraidsirens.net/forums")
+
+    session.get("/")
+    assert session.sid == "sid1"
+    assert session.user_id == 1
+
+    for _ in range(3):
+        session.get("/")
+        session.get("/index.php")
+
+    assert len(writes) == 1
+
+    session.cookies.clear()
+    session.cookies.set("phpbb3_cookie_sid", "sid2")
+    session.get("/index.php")
+
+    assert session.sid == "sid2"
+    assert len(writes) == 2
+
+    restored = api_client.PhpBBSession(base_url="https://airraidsirens.net/forums")
+    assert restored.load_session()
+    assert restored.sid == "sid2"
+
+    restored.get("/index.php")
+    assert len(writes) == 2
+
+
+class FakeAdmSession:
+    def __init__(self, sid: str):
+        self.sid = sid
+
+
+def test_get_adm_session_reuses_session(monkeypatch):
+    logins = []
+
+    def _login_to_phpbb():
+        session = FakeAdmSession(sid=f"sid{len(logins)}")
+        logins.append(session)
+        return session, True
+
+    monkeypatch.setattr(api_client, "_login_to_phpbb", _login_to_phpbb)
+    monkeypatch.setattr(api_client, "_login_to_adm", lambda session: session)
+
+    session = api_client._get_adm_session()
+    assert api_client._get_adm_session() is session
+    assert len(logins) == 1
+
+    # phpBB rejected the sid
+    api_client._invalidate_adm_session(session)
+    session = api_client._get_adm_session()
+    assert session.sid == "sid1"
+
+    # The ACP session has expired
+    api_client._adm_session.expires_at = 0
+    assert api_client._get_adm_session().sid == "sid2"
+    assert len(logins) == 3
+
+
+def test_wait_for_form_age(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(api_client.time, "sleep", sleeps.append)
+    monkeypatch.setattr(api_client.time, "monotonic", lambda: 100.0)
+
+    api_client._wait_for_form_age(99.0)
+    api_client._wait_for_form_age(90.0)
+
+    assert sleeps == [api_client.PHPBB_FORM_MIN_AGE_SECONDS - 1]
+
+
 def test_ban_action_enum():
     assert api_client.BanAction.BANUSER.value == "banuser"
     assert api_client.BanAction.BANEMAIL.value == "banemail"
     assert api_client.BanAction.BANIP.value == "banip"
+
+
+def _make_queue_row(post_id: int, author_id: int) -> str:
+    return f"""
+    <tr class="row{1 + post_id % 2}">
+      <td>
+        <a class="topictitle" href="./viewtopic.php?f=2&amp;p={post_id}#p{post_id}">Topic {post_id}</a>
+        <span>Forum: <a href="./viewforum.php?f=2">Sirens</a></span>
+      </td>
+      <td><a href="./memberlist.php?mode=viewprofile&amp;u={author_id}">user{author_id}</a></td>
+      <td>January 2nd, 2025, 3:04 pm</td>
+    </tr>
+    """
+
+
+def _make_queue_page(post_ids) -> str:
+    rows = "".join(_make_queue_row(post_id, post_id * 10) for post_id in post_ids)
+    return f'<html><body><div id="mcp"><table>{rows}</table></div></body></html>'
+
+
+class SlowEnricher:
+    def __init__(self, delays: dict):
+        self._delays = delays
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    async def __call__(self, session, topic_approval_request, mode):
+        query_args = parse_qs(urlparse(topic_approval_request["topic_url"]).query)
+        post_id = int(query_args["p"][0])
+        self.calls.append(post_id)
+
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self._delays[post_id])
+        self.running -= 1
+
+        if post_id == 3:
+            return None
+
+        topic_approval_request["post_id"] = post_id
+        topic_approval_request["mode"] = mode
+        return topic_approval_request
+
+
+@pytest_asyncio.fixture
+async def queue_server():
+    post_ids = [1, 2, 3, 4, 5, 6]
+
+    async def _mcp(request):
+        return web.Response(text=_make_queue_page(post_ids), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/forums/mcp.php", _mcp)
+
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+
+    yield server
+
+    await server.close()
+    await http.close_client_session()
+
+
+@pytest.mark.asyncio
+async def test_load_posts_topics_awaiting_approval_keeps_queue_order(queue_server):
+    session = api_client.AsyncPhpBBSession(
+        base_url=f"http://127.0.0.1:{queue_server.port}/forums"
+    )
+
+    # Earlier rows finish last
+    enricher = SlowEnricher({1: 0.06, 2: 0.05, 3: 0.04, 4: 0.03, 5: 0.02, 6: 0.01})
+
+    with (
+        patch.object(api_client, "_enrich_moderatable_post", new=enricher),
+        patch.object(api_client, "PHPBB_ENRICH_CONCURRENCY", 2),
+    ):
+        posts = await api_client._load_posts_topics_awaiting_approval(
+            session=session, mode="unapproved_posts"
+        )
+
+    assert [post["post_id"] for post in posts] == [1, 2, 4, 5, 6]
+    assert posts[0]["author_id"] == 10
+    assert posts[0]["author_url"] == "/memberlist.php?mode=viewprofile&u=10"
+    assert enricher.max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_load_posts_topics_awaiting_approval_skips_known_posts(queue_server):
+    session = api_client.AsyncPhpBBSession(
+        base_url=f"http://127.0.0.1:{queue_server.port}/forums"
+    )
+
+    enricher = SlowEnricher({1: 0, 2: 0, 3: 0, 4: 0, 5: 0, 6: 0})
+
+    with patch.object(api_client, "_enrich_moderatable_post", new=enricher):
+        posts = await api_client._load_posts_topics_awaiting_approval(
+            session=session,
+            mode="unapproved_topics",
+            known_post_ids={2, 3, 5},
+        )
+
+    assert enricher.calls == [1, 4, 6]
+
+    # Known posts are still listed so the task knows they're in the queue
+    assert [post["post_id"] for post in posts] == [1, 2, 3, 4, 5, 6]
+    assert posts[1]["mode"] == "unapproved_topics"
+    assert posts[1]["post_ip_address"] == ""
+
+
+def _make_topic_post(posted: str, approved: bool) -> str:
+    approve_marker = "" if approved else '<span class="postapprove">Unapproved</span>'
+    return f"""
+    <table class="tablebg" width="100%" cellspacing="1">
+      <tr><td class="gensmall">Post subject: Re: Sirens Posted: {posted}</td></tr>
+      <tr><td>{approve_marker}<div class="postbody">Text</div></td></tr>
+    </table>
+    """
+
+
+def _make_topic_page(topic_id: int, page: int, last_page: int, posts: list) -> str:
+    post_count = sum(len(page_posts) for page_posts in TOPIC_PAGES.values())
+    page_x_of_y = f"&nbsp;Page <strong>{page}</strong> of <strong>{last_page}</strong>"
+    return f"""
+    <html><body>
+      <div id="pageheader"><h2><a href="./viewtopic.php?f=2&amp;t={topic_id}">Sirens</a></h2></div>
+      <table><tr>
+        <td class="nav" valign="middle" nowrap="nowrap">{page_x_of_y}</td>
+        <td class="gensmall" nowrap="nowrap">&nbsp;[ {post_count} posts ]&nbsp;</td>
+      </tr></table>
+      {"".join(_make_topic_post(*post) for post in posts)}
+    </body></html>
+    """
+
+
+TOPIC_PAGES = {
+    1: [("January 1st, 2025, 1:00 pm", True)] * 10,
+    2: [("January 2nd, 2025, 2:00 pm", True)] * 9
+    + [("January 3rd, 2025, 3:00 pm", False)],
+    3: [("January 4th, 2025, 4:00 pm", False)],
+}
+
+
+@pytest_asyncio.fixture
+async def topic_server():
+    requested_pages = []
+
+    async def _viewtopic(request):
+        if "p" in request.query:
+            # Post links land on the page holding the post
+            page = 3 if int(request.query["p"]) == 30 else 2
+        else:
+            page = int(request.query.get("start", 0)) // 10 + 1
+
+        requested_pages.append(page)
+
+        content = _make_topic_page(7, page, 3, TOPIC_PAGES[page])
+        return web.Response(text=content, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/forums/viewtopic.php", _viewtopic)
+
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+    server.requested_pages = requested_pages
+
+    yield server
+
+    await server.close()
+    await http.close_client_session()
+
+
+@pytest.mark.asyncio
+async def test_extract_topic_details_starts_at_last_page(topic_server):
+    api_client._last_approved_post_dates.clear()
+
+    session = api_client.AsyncPhpBBSession(
+        base_url=f"http://127.0.0.1:{topic_server.port}/forums"
+    )
+
+    topic_details = await api_client._extract_topic_details(
+        session, {"topic_url": "/viewtopic.php?f=2&p=30#p30"}
+    )
+
+    # Landed on the last page, so only the page before it needed loading
+    assert topic_server.requested_pages == [3, 2]
+    assert topic_details["last_approved_post_date"].format("YYYY-MM-DD HH:mm") == (
+        "2025-01-02 14:00"
+    )
+
+    topic_server.requested_pages.clear()
+
+    # Another queued reply in the same topic reuses the cached date
+    topic_details = await api_client._extract_topic_details(
+        session, {"topic_url": "/viewtopic.php?f=2&p=20#p20"}
+    )
+
+    assert topic_server.requested_pages == [2]
+    assert topic_details["last_approved_post_date"].format("YYYY-MM-DD HH:mm") == (
+        "2025-01-02 14:00"
+    )
+
+    # A new reply changes the post count and drops the cached entry
+    TOPIC_PAGES[3].append(("January 5th, 2025, 5:00 pm", True))
+    topic_server.requested_pages.clear()
+
+    try:
+        topic_details = await api_client._extract_topic_details(
+            session, {"topic_url": "/viewtopic.php?f=2&p=30#p30"}
+        )
+    finally:
+        TOPIC_PAGES[3].pop()
+
+    assert topic_server.requested_pages == [3]
+    assert topic_details["last_approved_post_date"].format("YYYY-MM-DD HH:mm") == (
+        "2025-01-05 17:00"
+    )
+
+
+@pytest.mark.asyncio
+async def test_extract_topic_details_forgets_moderated_posts(topic_server):
+    api_client._last_approved_post_dates.clear()
+    api_client._queued_post_topics.clear()
+
+    session = api_client.AsyncPhpBBSession(
+        base_url=f"http://127.0.0.1:{topic_server.port}/forums"
+    )
+    topic_approval_request = {"topic_url": "/viewtopic.php?f=2&p=30#p30", "post_id": 30}
+
+    await api_client._extract_topic_details(session, topic_approval_request)
+    assert 7 in api_client._last_approved_post_dates
+
+    # Moderating a queued post can change the date while the post count stays the same
+    api_client.forget_moderated_post(30)
+    assert 7 not in api_client._last_approved_post_dates
+
+    topic_server.requested_pages.clear()
+    await api_client._extract_topic_details(session, topic_approval_request)
+
+    assert topic_server.requested_pages == [3, 2]
+
+
+PROFILE_PAGE = """
+<form>
+  <table>
+    <tr><td class="row1">Avatar</td></tr>
+    <tr>
+      <td class="row1">
+        <table>
+          <tr><td>Joined: </td><td>January 2nd, 2020, 3:04 pm</td></tr>
+          <tr><td>Last visited: </td><td>-</td></tr>
+          <tr><td>Warnings: </td><td>1 [ View user notes  | Warn user ]</td></tr>
+          <tr><td>Total posts: </td><td><b class="gen">7</b></td></tr>
+        </table>
+      </td>
+    </tr>
+    <tr><td>Groups: </td><td><select><option>Registered users</option></select></td></tr>
+  </table>
+</form>
+"""
+
+
+@pytest_asyncio.fixture
+async def profile_server():
+    async def _memberlist(request):
+        _memberlist.hits += 1
+        await asyncio.sleep(0.01)
+        return web.Response(text=PROFILE_PAGE, content_type="text/html")
+
+    _memberlist.hits = 0
+
+    app = web.Application()
+    app.router.add_get("/forums/memberlist.php", _memberlist)
+
+    server = TestServer(app, host="127.0.0.1")
+    await server.start_server()
+
+    yield server, _memberlist
+
+    await server.close()
+    await http.close_client_session()
+
+
+@pytest.mark.asyncio
+async def test_extract_user_details_caches_profiles(profile_server):
+    server, memberlist = profile_server
+    session = api_client.AsyncPhpBBSession(
+        base_url=f"http://127.0.0.1:{server.port}/forums"
+    )
+    request = {"author_id": 10, "author_url": "/memberlist.php?mode=viewprofile&u=10"}
+
+    # Several queued posts from the same author share one profile load
+    results = await asyncio.gather(
+        *[api_client._extract_user_details(session, request) for _ in range(3)]
+    )
+    assert memberlist.hits == 1
+
+    cached = await api_client._extract_user_details(session, request)
+    assert memberlist.hits == 1
+
+    for user_details in [*results, cached]:
+        assert user_details["user_join_date"] == arrow.get(2020, 1, 2, 15, 4)
+        assert user_details["user_warning_count"] == 1
+        assert user_details["user_post_count"] == 7
+        assert user_details["user_group_list"] == "Registered users"
+
+    api_client.invalidate_user_profile(10)
+    await api_client._extract_user_details(session, request)
+    assert memberlist.hits == 2
+
+    with patch.object(api_client, "PHPBB_USER_PROFILE_TTL_SECONDS", -1):
+        await api_client._extract_user_details(session, request)
+    assert memberlist.hits == 3
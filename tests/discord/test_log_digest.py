@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from arsbot.discord.log_digest import LogDigest
+
+
+class Writer:
+    def __init__(self):
+        self.messages = []
+        self.embeds = []
+
+    async def __call__(self, message=None, *, embed=None):
+        if embed:
+            self.embeds.append(embed)
+        else:
+            self.messages.append(message)
+
+
+@pytest.mark.asyncio
+async def test_log_digest_sends_idle_events_immediately(monkeypatch):
+    monkeypatch.setenv("LOG_DIGEST_WINDOW_SECONDS", "0")
+
+    writer = Writer()
+    digest = LogDigest("Wiki log", writer)
+
+    await digest.add("first", "alice")
+    await digest.add("second", "bob")
+
+    assert writer.messages == ["first", "second"]
+    assert writer.embeds == []
+
+
+@pytest.mark.asyncio
+async def test_log_digest_summarises_events_within_window(monkeypatch):
+    monkeypatch.setenv("LOG_DIGEST_WINDOW_SECONDS", "0.05")
+
+    writer = Writer()
+    digest = LogDigest("Wiki log", writer)
+
+    await digest.add("account 1 denied", "arsbot")
+    for index in range(2, 5):
+        await digest.add(f"account {index} denied", "arsbot")
+    await digest.add("account 5 approved", "alice")
+
+    assert writer.messages == ["account 1 denied"]
+
+    await asyncio.sleep(0.1)
+
+    assert len(writer.embeds) == 1
+    embed = writer.embeds[0]
+    assert embed.title == "Wiki log: 4 actions"
+    assert embed.description.splitlines() == [
+        "account 2 denied",
+        "account 3 denied",
+        "account 4 denied",
+        "account 5 approved",
+    ]
+    assert [(field.name, field.value) for field in embed.fields] == [
+        ("arsbot", "3"),
+        ("alice", "1"),
+    ]
+
+    # Once the window has passed without events the next one goes out on its own
+    await asyncio.sleep(0.1)
+    await digest.add("account 6 denied", "alice")
+
+    assert writer.messages == ["account 1 denied", "account 6 denied"]
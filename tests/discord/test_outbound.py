@@ -0,0 +1,158 @@
+from unittest.mock import patch
+import asyncio
+
+import pytest
+
+from arsbot.discord import outbound
+from arsbot.discord.outbound import OutboundDispatcher, Priority
+
+
+class Channel:
+    def __init__(self, channel_id: int, sent: list, gate: asyncio.Event = None):
+        self.id = channel_id
+        self._sent = sent
+        self._gate = gate
+
+    async def send(self, content=None, **kwargs):
+        if self._gate:
+            await self._gate.wait()
+
+        self._sent.append((self.id, content, kwargs))
+        await asyncio.sleep(0)
+
+        return f"message {len(self._sent)}"
+
+
+async def _wait_until_queued(dispatcher: OutboundDispatcher, priority, count: int):
+    for _ in range(100):
+        if len(dispatcher._queues[priority]) == count:
+            return
+
+        await asyncio.sleep(0)
+
+    raise AssertionError("Messages weren't queued")
+
+
+@pytest.mark.asyncio
+async def test_send_without_dispatcher_running():
+    sent = []
+    dispatcher = OutboundDispatcher()
+
+    message = await dispatcher.send(Channel(1, sent), "hello", priority=Priority.DEBUG)
+
+    assert message == "message 1"
+    assert sent == [(1, "hello", {})]
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_sends_by_priority_and_coalesces():
+    sent = []
+    gate = asyncio.Event()
+    dispatcher = OutboundDispatcher()
+
+    with patch.object(outbound, "DISPATCH_CONCURRENCY", 1):
+        dispatcher.start()
+
+    # Keeps the only worker busy while the rest is queued
+    blocked = asyncio.create_task(dispatcher.send(Channel(1, sent, gate), "blocked"))
+    await asyncio.sleep(0)
+
+    debug_channel = Channel(2, sent)
+    log_channel = Channel(3, sent)
+    moderation_channel = Channel(4, sent)
+
+    tasks = [
+        asyncio.create_task(
+            dispatcher.send(debug_channel, "debug", priority=Priority.DEBUG)
+        ),
+        *[
+            asyncio.create_task(dispatcher.send(log_channel, f"log {index}"))
+            for index in range(3)
+        ],
+        asyncio.create_task(
+            dispatcher.send(
+                moderation_channel, embed="embed", priority=Priority.MODERATION
+            )
+        ),
+    ]
+    await _wait_until_queued(dispatcher, Priority.LOG, 3)
+
+    gate.set()
+    results = await asyncio.gather(blocked, *tasks)
+    await dispatcher.stop()
+
+    assert sent == [
+        (1, "blocked", {}),
+        (4, None, {"embed": "embed"}),
+        (3, "log 0\nlog 1\nlog 2", {}),
+        (2, "debug", {}),
+    ]
+
+    # Coalesced lines share the message they were sent in
+    assert results[2] == results[3] == results[4] == "message 3"
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_applies_backpressure():
+    sent = []
+    gate = asyncio.Event()
+    dispatcher = OutboundDispatcher()
+
+    with patch.object(outbound, "DISPATCH_CONCURRENCY", 1):
+        dispatcher.start()
+
+    channel = Channel(1, sent, gate)
+
+    with patch.dict(outbound.MAX_QUEUED_MESSAGES, {Priority.DEBUG: 1}):
+        first = asyncio.create_task(
+            dispatcher.send(channel, embed="1", priority=Priority.DEBUG)
+        )
+        await asyncio.sleep(0)
+
+        second = asyncio.create_task(
+            dispatcher.send(channel, embed="2", priority=Priority.DEBUG)
+        )
+        third = asyncio.create_task(
+            dispatcher.send(channel, embed="3", priority=Priority.DEBUG)
+        )
+        await _wait_until_queued(dispatcher, Priority.DEBUG, 1)
+        await asyncio.sleep(0.01)
+
+        # The third sender is waiting for room instead of growing the queue
+        assert len(dispatcher._queues[Priority.DEBUG]) == 1
+        assert not third.done()
+
+        gate.set()
+        await asyncio.gather(first, second, third)
+
+    await dispatcher.stop()
+
+    assert [kwargs["embed"] for _, _, kwargs in sent] == ["1", "2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_stop_cancels_messages_being_sent():
+    sent = []
+    gate = asyncio.Event()
+    dispatcher = OutboundDispatcher()
+
+    with patch.object(outbound, "DISPATCH_CONCURRENCY", 1):
+        dispatcher.start()
+
+    slow_channel = Channel(1, sent, gate)
+    sending = [
+        asyncio.create_task(dispatcher.send(slow_channel, text))
+        for text in ("first", "second")
+    ]
+    queued = asyncio.create_task(dispatcher.send(Channel(2, sent), "queued"))
+
+    await _wait_until_queued(dispatcher, Priority.LOG, 1)
+
+    await dispatcher.stop()
+
+    # Both the coalesced batch being sent and the queued message are given up on
+    for task in (*sending, queued):
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(task, timeout=1)
+
+    assert sent == []
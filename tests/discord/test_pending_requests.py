@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+
+import pytest
+
+from arsbot.discord import pending_requests
+from arsbot.discord.const import PENDING_REQUEST_RECONCILE_FREQUENCY_SECONDS
+from arsbot.discord.pending_requests import PendingRequestIndex
+
+
+@dataclass
+class DiscordUser:
+    id: int
+
+
+@dataclass
+class DiscordChannel:
+    id: int
+
+
+@dataclass
+class DiscordMessage:
+    id: int
+    channel: DiscordChannel
+    author: DiscordUser
+
+
+@dataclass
+class DiscordClient:
+    user: DiscordUser
+
+    def __post_init__(self):
+        self.views = []
+
+    def add_view(self, view, *, message_id: int) -> None:
+        self.views.append(message_id)
+
+
+def test_pending_request_index_tracks_sends_and_deletes():
+    index = PendingRequestIndex(channel_id=1)
+    assert index.needs_reconcile(now=0)
+
+    index.reconcile({10: 100, 11: 101}, now=0)
+    assert not index.needs_reconcile(now=1)
+    assert index.request_ids() == {10, 11}
+
+    index.add(12, 102)
+    index.discard_message(100)
+    index.discard_request(11)
+    assert index.request_ids() == {12}
+
+    assert index.needs_reconcile(now=PENDING_REQUEST_RECONCILE_FREQUENCY_SECONDS)
+
+
+def test_pending_request_index_reconciles_on_unknown_bot_message():
+    index = PendingRequestIndex(channel_id=1)
+    index.reconcile({}, now=0)
+
+    # Our own send shows up on the gateway before it's added to the index
+    index.note_message(100)
+    index.add(10, 100)
+    assert not index.needs_reconcile(now=1)
+
+    # A message we never recorded, e.g. from another instance
+    index.note_message(200)
+    assert index.needs_reconcile(now=1)
+
+
+@pytest.mark.asyncio
+async def test_pending_request_index_gateway_hooks():
+    channel_id = 987654321
+    index = pending_requests.get_pending_request_index(str(channel_id))
+    assert pending_requests.get_pending_request_index(channel_id) is index
+
+    index.reconcile({10: 100, 11: 101, 12: 102}, now=0)
+
+    client = DiscordClient(user=DiscordUser(id=1))
+    await pending_requests._on_message_delete(client, channel_id, {100, 101})
+    assert index.request_ids() == {12}
+
+    # Messages by other users are left to delete_non_bot_messages
+    other_message = DiscordMessage(300, DiscordChannel(channel_id), DiscordUser(id=2))
+    await pending_requests._on_message(client, other_message)
+    assert not index.needs_reconcile(now=1)
+
+    bot_message = DiscordMessage(301, DiscordChannel(channel_id), DiscordUser(id=1))
+    await pending_requests._on_message(client, bot_message)
+    assert index.needs_reconcile(now=1)
+
+    index.reconcile({12: 102}, now=1)
+    await pending_requests._on_ready(client)
+    assert index.needs_reconcile(now=2)
+
+
+def test_pending_request_index_registers_views_once():
+    client = DiscordClient(user=DiscordUser(id=1))
+    index = PendingRequestIndex(channel_id=1)
+
+    index.reconcile({10: 100, 11: 101}, now=0)
+    assert index.register_views(client, view=None) == 2
+
+    # Messages we send already have their view registered by discord.py
+    index.add(12, 102)
+    index.reconcile({10: 100, 11: 101, 12: 102}, now=1)
+    assert index.register_views(client, view=None) == 0
+    assert sorted(client.views) == [100, 101]
+
+    # Everything is registered again after a reconnect
+    index.mark_stale()
+    index.reconcile({10: 100, 12: 102}, now=2)
+    assert index.register_views(client, view=None) == 2
+    assert sorted(client.views) == [100, 100, 101, 102]
@@ -0,0 +1,54 @@
+from unittest.mock import patch
+import asyncio
+
+import pytest
+
+from arsbot.discord import run
+
+
+class FlakyIntegration:
+    def __init__(self, failures: int):
+        self._failures = failures
+        self.calls = 0
+        self.finished = asyncio.Event()
+
+    async def __call__(self, client) -> None:
+        self.calls += 1
+        await asyncio.sleep(0)
+
+        if self.calls <= self._failures:
+            raise RuntimeError(f"failure {self.calls}")
+
+        self.finished.set()
+        await asyncio.Event().wait()
+
+
+class Writer:
+    def __init__(self):
+        self.records = []
+
+    async def __call__(self, text: str, **kwargs) -> None:
+        self.records.append(text)
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_supervise_integration_restarts_after_failure():
+    integration = FlakyIntegration(failures=2)
+
+    with (
+        patch.object(run, "INTEGRATION_RESTART_DELAY_SECONDS", 0),
+        patch.object(run, "send_to_connect_channels", new_callable=Writer) as writer,
+    ):
+        task = asyncio.create_task(run.supervise_integration("pytest", integration))
+
+        await asyncio.wait_for(integration.finished.wait(), timeout=1)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert integration.calls == 3
+    assert len(writer.records) == 2
+    assert "failure 1" in writer.records[0]
+    assert "failure 2" in writer.records[1]
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta, timezone
+
+import discord
+import pytest
+from discord.errors import NotFound
+
+from arsbot.discord import utils
+
+
+class PartialMessage:
+    def __init__(self, channel, message_id: int):
+        self._channel = channel
+        self.id = message_id
+
+    async def delete(self) -> None:
+        if self.id not in self._channel.message_ids:
+            raise NotFound(FakeResponse(), "Unknown Message")
+
+        self._channel.message_ids.remove(self.id)
+        self._channel.single_deletes += 1
+
+
+class FakeResponse:
+    status = 404
+    reason = "Not Found"
+
+
+class Channel:
+    def __init__(self, message_ids: list):
+        self.message_ids = set(message_ids)
+        self.bulk_deletes = []
+        self.single_deletes = 0
+
+    def get_partial_message(self, message_id: int) -> PartialMessage:
+        return PartialMessage(self, message_id)
+
+    async def delete_messages(self, messages) -> None:
+        assert 2 <= len(messages) <= 100
+        self.bulk_deletes.append([message.id for message in messages])
+        self.message_ids -= {message.id for message in messages}
+
+
+def _message_id(age: timedelta, offset: int) -> int:
+    return discord.utils.time_snowflake(datetime.now(timezone.utc) - age) + offset
+
+
+@pytest.mark.asyncio
+async def test_delete_messages_bulk_deletes_recent_messages():
+    recent_ids = [_message_id(timedelta(hours=1), offset) for offset in range(150)]
+    old_ids = [_message_id(timedelta(days=20), offset) for offset in range(2)]
+    missing_id = _message_id(timedelta(days=30), 0)
+
+    channel = Channel(recent_ids + old_ids)
+
+    deleted = await utils.delete_messages(channel, recent_ids + old_ids + [missing_id])
+
+    assert deleted == 152
+    assert not channel.message_ids
+    assert [len(batch) for batch in channel.bulk_deletes] == [100, 50]
+
+    # Too old for bulk deletes
+    assert channel.single_deletes == 2
+
+
+class Client:
+    def __init__(self, cached_channels: dict):
+        self.cached_channels = cached_channels
+        self.fetches = []
+
+    def get_channel(self, channel_id: int):
+        return self.cached_channels.get(channel_id)
+
+    async def fetch_channel(self, channel_id):
+        self.fetches.append(channel_id)
+        return Channel([])
+
+
+@pytest.mark.asyncio
+async def test_resolve_channel_fetches_uncached_channels_once():
+    cached_channel = Channel([])
+    client = Client({1: cached_channel})
+
+    assert await utils.resolve_channel(client, "1") is cached_channel
+    assert client.fetches == []
+
+    fetched_channel = await utils.resolve_channel(client, "2")
+    assert await utils.resolve_channel(client, 2) is fetched_channel
+    assert client.fetches == ["2"]
+
+    await utils._forget_channel(client, 2)
+
+    assert await utils.resolve_channel(client, "2") is not fetched_channel
+    assert client.fetches == ["2", "2"]
@@ -0,0 +1,29 @@
+import pytest
+
+from arsbot.utils import files
+
+
+def test_atomic_write(bot_data_dir):
+    path = bot_data_dir / "session.data"
+
+    files.atomic_write(str(path), b"first")
+    files.atomic_write(str(path), b"second")
+
+    assert path.read_bytes() == b"second"
+    assert not list(bot_data_dir.glob(".session.data.*"))
+
+
+def test_atomic_write_keeps_old_file_on_error(bot_data_dir, monkeypatch):
+    path = bot_data_dir / "session.data"
+    path.write_bytes(b"old")
+
+    def _failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(files.os, "replace", _failing_replace)
+
+    with pytest.raises(OSError):
+        files.atomic_write(str(path), b"new")
+
+    assert path.read_bytes() == b"old"
+    assert not list(bot_data_dir.glob(".session.data.*"))
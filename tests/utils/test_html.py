@@ -0,0 +1,46 @@
+from bs4 import SoupStrainer
+import pytest
+
+from arsbot.utils import html
+
+
+PAGE = """
+<html>
+  <head><script>var x = 1;</script></head>
+  <body>
+    <h2>Moderator Control Panel</h2>
+    <form id="login"><input name="sid" value="abc"></form>
+    <div id="mcp"><table><tr class="row1"><td>queued</td></tr></table></div>
+  </body>
+</html>
+"""
+
+
+@pytest.fixture(autouse=True, params=["html.parser", "lxml"])
+def html_parser(request, monkeypatch):
+    if request.param == "lxml":
+        pytest.importorskip("lxml")
+
+    monkeypatch.setattr(html, "HTML_PARSER", request.param)
+
+    return request.param
+
+
+def test_parse_html():
+    page = html.parse_html(PAGE)
+
+    assert page.find("h2").text == "Moderator Control Panel"
+    assert page.find(id="mcp").select_one("td").text == "queued"
+
+
+def test_parse_html_parse_only():
+    page = html.parse_html(PAGE, parse_only=SoupStrainer(id="mcp"))
+
+    assert page.find("h2") is None
+    assert page.find("script") is None
+    assert page.find(id="mcp").select_one("tr.row1 td").text == "queued"
+
+    page = html.parse_html(PAGE, parse_only=SoupStrainer("form"))
+
+    assert [form.attrs["id"] for form in page.find_all("form")] == ["login"]
+    assert page.find("input").attrs["value"] == "abc"
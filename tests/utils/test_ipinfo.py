@@ -1,8 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 import json
 import re
+import time
 
 import responses
 
+from arsbot.utils import ipinfo
 from arsbot.utils.ipinfo import get_ip_address_info
 
 
@@ -81,7 +85,102 @@ def test_get_ip_address_info(bot_env_config, patch_ipinfo):
     assert ip_info is None
     assert counter.count == 2
 
-    # Shouldn't be cached since the response failed
+    # Failures are remembered for a short while instead of being retried every sync
     ip_info = get_ip_address_info("0")
     assert ip_info is None
-    assert counter.count == 3
+    assert counter.count == 2
+
+    with patch.object(ipinfo, "IP_FAILURE_TTL_SECONDS", -1):
+        ipinfo.clear_ip_cache()
+        get_ip_address_info("0")
+        ip_info = get_ip_address_info("0")
+    assert ip_info is None
+    assert counter.count == 4
+
+
+@responses.activate
+def test_get_ip_address_info_uses_stored_lookups(bot_env_config, patch_ipinfo):
+    counter.reset()
+
+    responses.add_callback(
+        responses.GET,
+        url=re.compile(r"https://ipinfo\.io/[0-9\.]+$"),
+        callback=_get_ipinfo_callback,
+    )
+
+    assert get_ip_address_info("127.0.0.1")["org"] == "localnet"
+    assert counter.count == 1
+
+    # Lookups survive a restart through the bot database
+    ipinfo.clear_ip_cache()
+    assert get_ip_address_info("127.0.0.1")["org"] == "localnet"
+    assert counter.count == 1
+
+    # Expired lookups are fetched again
+    with patch.object(ipinfo, "IP_CACHE_TTL_SECONDS", -1):
+        ipinfo.clear_ip_cache()
+        assert get_ip_address_info("127.0.0.1")["org"] == "localnet"
+    assert counter.count == 2
+
+
+@responses.activate
+def test_get_ip_address_info_coalesces_lookups(bot_env_config, patch_ipinfo):
+    counter.reset()
+
+    def _slow_ipinfo_callback(request):
+        time.sleep(0.05)
+        return _get_ipinfo_callback(request)
+
+    responses.add_callback(
+        responses.GET,
+        url=re.compile(r"https://ipinfo\.io/[0-9\.]+$"),
+        callback=_slow_ipinfo_callback,
+    )
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(get_ip_address_info, ["127.0.0.1"] * 4))
+
+    assert counter.count == 1
+    assert all(ip_info["org"] == "localnet" for ip_info in results)
+
+
+def _post_ipinfo_batch_callback(request):
+    assert request.headers["Authorization"] == "Bearer pytest"
+
+    ip_addrs = {
+        "127.0.0.1": {"city": "Los Angeles", "org": "localnet"},
+        "127.0.0.2": {"city": "Seattle", "org": "localnet"},
+    }
+    content = {
+        ip: ip_addrs.get(ip, {"error": "Not found"}) for ip in json.loads(request.body)
+    }
+
+    counter.incr()
+    return (200, {"Content-Type": "application/json"}, json.dumps(content))
+
+
+@responses.activate
+def test_get_ip_addresses_info_batches_lookups(
+    bot_env_config, patch_ipinfo, monkeypatch
+):
+    counter.reset()
+    monkeypatch.setenv("IPINFO_TOKEN", "pytest")
+
+    responses.add_callback(
+        responses.POST,
+        url="https://ipinfo.io/batch",
+        callback=_post_ipinfo_batch_callback,
+    )
+
+    results = ipinfo.get_ip_addresses_info(["127.0.0.1", "127.0.0.2", "0", "127.0.0.1"])
+
+    assert counter.count == 1
+    assert results == {
+        "127.0.0.1": {"city": "Los Angeles", "org": "localnet"},
+        "127.0.0.2": {"city": "Seattle", "org": "localnet"},
+        "0": None,
+    }
+
+    # Everything, including the failure, is cached now
+    ipinfo.get_ip_addresses_info(["127.0.0.1", "127.0.0.2", "0"])
+    assert counter.count == 1